@@ -0,0 +1,352 @@
+"""Times the matching hot paths on synthetic rigs and writes machine-readable JSON results.
+
+Run it with any python that has numpy, maya is not needed (the fake scene backend is used):
+
+    python benchmarks/run_benchmarks.py --limbs 1 10 100 1000 --frames 1 100 1000 10000 --output bench.json
+
+Compare against a previous run and fail (exit code 1) on regressions:
+
+    python benchmarks/run_benchmarks.py --baseline bench.json --max-regression 0.25
+
+From mayapy, --backend maya times the real maya.cmds instead. Results carry the seconds spent
+in the library's batches, and --compare-suspension times them again without suspending the
+viewport to report what suspension saves, which only means something in maya.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+
+# Make the tool importable as a package, whatever its folder is called
+PACKAGE_PATH = Path(__file__).resolve().parents[1]
+if str(PACKAGE_PATH.parent) not in sys.path:
+    sys.path.insert(0, str(PACKAGE_PATH.parent))
+PACKAGE = PACKAGE_PATH.name
+
+cmds_backend = importlib.import_module(PACKAGE + '.libs.cmds_backend')
+fake_cmds = importlib.import_module(PACKAGE + '.libs.fake_cmds')
+evaluation = importlib.import_module(PACKAGE + '.libs.evaluation')
+match_utilities = importlib.import_module(PACKAGE + '.libs.match_utilities')
+limb_registry = importlib.import_module(PACKAGE + '.libs.limb_registry')
+synthetic_rigs = importlib.import_module(PACKAGE + '.benchmarks.synthetic_rigs')
+
+
+class _ComboBox():
+
+    """Minimal object answering what _matchProcess asks the limb combo box"""
+
+    def __init__(self, text):
+        self.text = text
+
+    def currentText(self):
+        return self.text
+
+
+# Qt application used by the main window benchmark
+_application = None
+
+
+class SkipBenchmark(Exception):
+
+    """Raised by a setup when a benchmark cannot run in this environment"""
+
+
+# ----------------------------------------------------------------------
+# Scene handling
+# ----------------------------------------------------------------------
+
+def _newScene(backend):
+
+    """Starts from an empty scene and returns the cmds-like object to build it with"""
+
+    if backend == 'maya':
+        from maya import cmds
+        cmds.file(new=True, force=True)
+        cmds_backend.setBackend(None)
+        return cmds
+
+    cmds = fake_cmds.FakeCmds()
+    cmds_backend.setBackend(cmds)
+    return cmds
+
+
+def _buildLimbs(cmds, limbs, register=False, joints=3):
+
+    """Builds a number of limbs, optionally registering them, and returns their field values"""
+
+    limbs_data = [synthetic_rigs.buildLimb(cmds, 'limb%04d' % i, seed=i, joints=joints) for i in range(limbs)]
+    if register:
+        for data in limbs_data:
+            match_utilities.MatchData(data)
+    return limbs_data
+
+
+def _matcher(data):
+
+    """Creates a Match object straight from GET DATA field values"""
+
+    return match_utilities.Match('%s.%s' % (data[0], data[1]), 0, 1,
+                                 match_utilities._splitNames(data[5:8]), match_utilities._splitNames(data[2:5]),
+                                 match_utilities._splitNames(data[11:14]), match_utilities._splitNames(data[8:11]))
+
+
+# ----------------------------------------------------------------------
+# Benchmarks, each setup returns the callable to time
+# ----------------------------------------------------------------------
+
+def setupMatchIKtoFK(cmds, limbs, frames, foreign_nodes, joints):
+    matchers = [_matcher(data) for data in _buildLimbs(cmds, limbs, joints=joints)]
+    return lambda: [matcher.IKtoFK() for matcher in matchers]
+
+
+def setupMatchFKtoIK(cmds, limbs, frames, foreign_nodes, joints):
+    limbs_data = _buildLimbs(cmds, limbs)
+    for data in limbs_data:
+        cmds.setAttr('%s.%s' % (data[0], data[1]), 0)
+    matchers = [_matcher(data) for data in limbs_data]
+    return lambda: [matcher.FKtoIK() for matcher in matchers]
+
+
+def setupCreateDatabaseNode(cmds, limbs, frames, foreign_nodes, joints):
+    limbs_data = _buildLimbs(cmds, limbs)
+    return lambda: [match_utilities.MatchData(data) for data in limbs_data]
+
+
+def setupMatchProcess(cmds, limbs, frames, foreign_nodes, joints):
+    combo_boxes = [_ComboBox(data[0]) for data in _buildLimbs(cmds, limbs, register=True)]
+    return lambda: [match_utilities._matchProcess(combo_box) for combo_box in combo_boxes]
+
+
+def setupMatchLimbs(cmds, limbs, frames, foreign_nodes, joints):
+    _buildLimbs(cmds, limbs, register=True)
+    return match_utilities.matchLimbs
+
+
+def setupMatchInstances(cmds, limbs, frames, foreign_nodes, joints):
+    limbs_data = synthetic_rigs.buildCrowd(cmds, 'arm', limbs)
+    # One template serves every instance
+    match_utilities.MatchData(limbs_data[0], template=True)
+    return match_utilities.matchLimbs
+
+
+def setupBakeIKtoFK(cmds, limbs, frames, foreign_nodes, joints):
+    limbs_data = _buildLimbs(cmds, limbs)
+    for i, data in enumerate(limbs_data):
+        synthetic_rigs.animateLimb(cmds, data, frames, seed=i)
+    matchers = [_matcher(data) for data in limbs_data]
+    return lambda: [matcher.bakeIKtoFK(1, frames) for matcher in matchers]
+
+
+def setupBakeAdaptive(cmds, limbs, frames, foreign_nodes, joints):
+    limbs_data = _buildLimbs(cmds, limbs)
+    for i, data in enumerate(limbs_data):
+        synthetic_rigs.animateLimb(cmds, data, frames, seed=i)
+    matchers = [_matcher(data) for data in limbs_data]
+    return lambda: [matcher.bakeIKtoFK(1, frames, sample_tolerance=(0.01, 0.1)) for matcher in matchers]
+
+
+def setupLimbDiscovery(cmds, limbs, frames, foreign_nodes, joints):
+    synthetic_rigs.addForeignNetworkNodes(cmds, foreign_nodes)
+    _buildLimbs(cmds, limbs, register=True)
+    # Time the uncached scene lookup, not the registry
+    return limb_registry._discoverLimbs
+
+
+def setupMainUI(cmds, limbs, frames, foreign_nodes, joints):
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        main_UI = importlib.import_module(PACKAGE + '.ui.main_UI')
+    except Exception as error:
+        raise SkipBenchmark("Qt is not available: %s" % error)
+
+    _buildLimbs(cmds, limbs, register=True)
+    # Keep the application alive for the whole run
+    global _application
+    _application = main_UI.QtWidgets.QApplication.instance() or main_UI.QtWidgets.QApplication([])
+    return lambda: main_UI.mainUI().deleteLater()
+
+
+# Name, setup and the size it scales with
+BENCHMARKS = (('match_ik_to_fk', setupMatchIKtoFK, 'limbs'),
+              ('match_fk_to_ik', setupMatchFKtoIK, 'limbs'),
+              ('create_database_node', setupCreateDatabaseNode, 'limbs'),
+              ('match_process', setupMatchProcess, 'limbs'),
+              ('match_limbs', setupMatchLimbs, 'limbs'),
+              ('match_instances', setupMatchInstances, 'limbs'),
+              ('main_ui', setupMainUI, 'limbs'),
+              ('limb_discovery', setupLimbDiscovery, 'foreign_nodes'),
+              ('match_chain', setupMatchIKtoFK, 'joints'),
+              ('bake_ik_to_fk', setupBakeIKtoFK, 'frames'),
+              ('bake_adaptive', setupBakeAdaptive, 'frames'))
+
+
+# ----------------------------------------------------------------------
+# Running and reporting
+# ----------------------------------------------------------------------
+
+def runBenchmark(name, setup, limbs, frames, foreign_nodes, joints, backend, repeat):
+
+    """Times a benchmark, keeping the best of a few fresh runs"""
+
+    result = {'name': name, 'limbs': limbs, 'frames': frames, 'foreign_nodes': foreign_nodes, 'joints': joints}
+    best = None
+    calls = None
+    timings = None
+    for i in range(repeat):
+        cmds = _newScene(backend)
+        try:
+            function = setup(cmds, limbs, frames, foreign_nodes, joints)
+        except SkipBenchmark as error:
+            result['skipped'] = str(error)
+            return result
+
+        calls_before = sum(getattr(cmds, 'calls', {}).values())
+        evaluation.resetTimings()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            calls = sum(getattr(cmds, 'calls', {}).values()) - calls_before
+            timings = evaluation.timings()
+
+    result['seconds'] = best
+    result['seconds_per_limb'] = best / limbs
+    # Seconds spent in the library's batches, with the viewport suspended or not
+    if timings['batches']:
+        key = 'suspended_seconds' if evaluation.isEnabled() else 'unsuspended_seconds'
+        result[key] = timings[key]
+    if backend == 'fake':
+        result['commands'] = calls
+    return result
+
+
+def compareSuspension(name, setup, limbs, frames, foreign_nodes, joints, backend, repeat, suspended_seconds):
+
+    """Times the batches of a benchmark again with suspension off, returns that time and what suspension saved"""
+
+    evaluation.setEnabled(False)
+    try:
+        result = runBenchmark(name, setup, limbs, frames, foreign_nodes, joints, backend, repeat)
+    finally:
+        evaluation.setEnabled(True)
+    return {'unsuspended_seconds': result['unsuspended_seconds'],
+            'suspension_saved_seconds': result['unsuspended_seconds'] - suspended_seconds}
+
+
+def compareResults(results, baseline, max_regression, noise_floor):
+
+    """Lists the results slower than their baseline counterpart by more than the allowed ratio"""
+
+    def key(entry):
+        return entry['name'], entry['limbs'], entry['frames'], entry.get('foreign_nodes', 0), entry.get('joints', 3)
+
+    reference = {key(entry): entry for entry in baseline['results']}
+    regressions = []
+    for result in results:
+        previous = reference.get(key(result))
+        if previous is None or 'seconds' not in previous or 'seconds' not in result:
+            continue
+        slowdown = result['seconds'] - previous['seconds']
+        if slowdown > noise_floor and result['seconds'] > previous['seconds'] * (1.0 + max_regression):
+            reason = 'slower'
+        # Command counts are deterministic, any increase is a regression
+        elif result.get('commands', 0) > previous.get('commands', result.get('commands', 0)):
+            reason = 'more commands'
+        else:
+            continue
+        regressions.append({'name': result['name'],
+                            'limbs': result['limbs'],
+                            'frames': result['frames'],
+                            'foreign_nodes': result['foreign_nodes'],
+                            'joints': result['joints'],
+                            'reason': reason,
+                            'baseline_seconds': previous['seconds'],
+                            'seconds': result['seconds'],
+                            'baseline_commands': previous.get('commands'),
+                            'commands': result.get('commands')})
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limbs', type=int, nargs='+', default=[1, 10, 100],
+                        help="limb counts for the per-limb benchmarks")
+    parser.add_argument('--frames', type=int, nargs='+', default=[1, 100, 1000],
+                        help="frame counts for the bake benchmarks")
+    parser.add_argument('--foreign-nodes', type=int, nargs='+', default=[0, 1000, 10000],
+                        help="unrelated network node counts for the discovery benchmarks")
+    parser.add_argument('--chain-joints', type=int, nargs='+', default=[3, 10, 40],
+                        help="joint counts for the long chain benchmarks")
+    parser.add_argument('--bake-limbs', type=int, default=1,
+                        help="number of limbs baked in the frame benchmarks")
+    parser.add_argument('--discovery-limbs', type=int, default=10,
+                        help="number of limbs registered in the discovery benchmarks")
+    parser.add_argument('--only', nargs='+', default=None,
+                        help="names of the benchmarks to run")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="fresh runs per measure, the fastest one is kept")
+    parser.add_argument('--backend', choices=('fake', 'maya'), default='fake')
+    parser.add_argument('--compare-suspension', action='store_true',
+                        help="also time the batches of each benchmark without suspension and report the time it saves")
+    parser.add_argument('--output', default=None,
+                        help="JSON file to write, prints to stdout when omitted")
+    parser.add_argument('--baseline', default=None,
+                        help="JSON results of a previous run to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="allowed slowdown ratio against the baseline")
+    parser.add_argument('--noise-floor', type=float, default=0.001,
+                        help="slowdowns below this many seconds are never reported")
+    options = parser.parse_args(arguments)
+
+    if options.backend == 'maya':
+        import maya.standalone
+        maya.standalone.initialize()
+
+    results = []
+    for name, setup, scale in BENCHMARKS:
+        if options.only and name not in options.only:
+            continue
+        if scale == 'limbs':
+            sizes = [(limbs, 1, 0, 3) for limbs in options.limbs]
+        elif scale == 'frames':
+            sizes = [(options.bake_limbs, frames, 0, 3) for frames in options.frames]
+        elif scale == 'joints':
+            sizes = [(1, 1, 0, joints) for joints in options.chain_joints]
+        else:
+            sizes = [(options.discovery_limbs, 1, foreign_nodes, 3) for foreign_nodes in options.foreign_nodes]
+        for limbs, frames, foreign_nodes, joints in sizes:
+            result = runBenchmark(name, setup, limbs, frames, foreign_nodes, joints, options.backend, options.repeat)
+            if options.compare_suspension and 'suspended_seconds' in result:
+                result.update(compareSuspension(name, setup, limbs, frames, foreign_nodes, joints,
+                                                options.backend, options.repeat, result['suspended_seconds']))
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+
+    report = {'environment': {'python': platform.python_version(),
+                              'platform': platform.platform(),
+                              'backend': options.backend},
+              'results': results}
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            report['regressions'] = compareResults(results, json.load(baseline_file),
+                                                   options.max_regression, options.noise_floor)
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Builds synthetic IK/FK limbs into any cmds-like backend (the fake scene or a real maya session)."""
+
+import random
+
+
+# Order of the fields filled in by the GET DATA window
+DATA_FIELDS = ('blend_control', 'blend_attribute',
+               'ik_joint_01', 'ik_joint_02', 'ik_joint_03',
+               'ik_control_01', 'ik_control_02', 'ik_control_03',
+               'fk_joint_01', 'fk_joint_02', 'fk_joint_03',
+               'fk_control_01', 'fk_control_02', 'fk_control_03')
+
+
+def buildLimb(cmds, name, seed=0, joints=3, control_parent=None):
+
+    """Builds an IK/FK limb (three joints by default) and returns the GET DATA field values describing it.
+
+    The fk controls hang under control_parent when given, like finger controls under a hand control.
+    """
+
+    rand = random.Random(seed)
+    root = cmds.createNode('transform', n=name + '_root')
+    cmds.setAttr(root + '.translate', rand.uniform(-50, 50), rand.uniform(0, 20), rand.uniform(-50, 50))
+
+    # Both joint chains share the same rest pose, the ik one gets posed
+    chain = {}
+    for side in ('ik', 'fk'):
+        parent = root
+        chain[side] = []
+        for i in range(joints):
+            joint = cmds.createNode('joint', n='%s_%s_joint_%02d' % (name, side, i + 1), p=parent)
+            cmds.setAttr(joint + '.translate', 3.0 if i else 0.0, 0, 0)
+            cmds.setAttr(joint + '.jointOrient', 0, -15 if i == 1 else 0, 0)
+            chain[side].append(joint)
+            parent = joint
+    for joint in chain['ik']:
+        cmds.setAttr(joint + '.rotate', rand.uniform(-40, 40), rand.uniform(-40, 40), rand.uniform(-40, 40))
+
+    # FK controls are chained under offset groups, IK controls live in world space
+    fk_controls = []
+    parent = control_parent or root
+    for i in range(joints):
+        offset = cmds.createNode('transform', n='%s_fk_offset_%02d' % (name, i + 1), p=parent)
+        cmds.setAttr(offset + '.translate', rand.uniform(-1, 1), rand.uniform(-1, 1), rand.uniform(-1, 1))
+        control = cmds.createNode('transform', n='%s_fk_control_%02d' % (name, i + 1), p=offset)
+        fk_controls.append(control)
+        parent = control
+    ik_controls = [cmds.createNode('transform', n='%s_ik_control_%02d' % (name, i + 1)) for i in range(joints)]
+
+    # Switch control starting in IK
+    blend_control = cmds.createNode('transform', n=name + '_switch')
+    cmds.addAttr(blend_control, ln='ikFk', at='double', min=0, max=1, dv=1, k=True)
+    cmds.setAttr(blend_control + '.ikFk', 1)
+
+    chains = (chain['ik'], ik_controls, chain['fk'], fk_controls)
+    if joints == 3:
+        return [blend_control, 'ikFk'] + [name for nodes in chains for name in nodes]
+    # Longer chains go in the first field of each group
+    return [blend_control, 'ikFk'] + [field for nodes in chains for field in (' '.join(nodes), '', '')]
+
+
+def buildCrowd(cmds, name, count, seed=0, joints=3):
+
+    """Builds the same limb in a number of namespaces, like references of one rig, and returns their field values"""
+
+    return [buildLimb(cmds, 'crowd%04d:%s' % (i, name), seed=seed, joints=joints) for i in range(count)]
+
+
+def animateLimb(cmds, data, frames, seed=0):
+
+    """Keys the IK joints of a limb over a frame count so bakes have something to follow"""
+
+    rand = random.Random(seed)
+    for joint in ' '.join(data[2:5]).split():
+        for attribute in ('rotateX', 'rotateY', 'rotateZ'):
+            for frame in (1, max(frames, 2)):
+                cmds.setKeyframe(joint, attribute=attribute, time=frame, value=rand.uniform(-60, 60))
+
+
+def addForeignNetworkNodes(cmds, count):
+
+    """Adds unrelated network nodes, like the ones shading or referencing leave in production scenes"""
+
+    return [cmds.createNode('network', n='foreign_network_%05d' % i) for i in range(count)]
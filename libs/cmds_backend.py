@@ -0,0 +1,51 @@
+"""Routes every maya.cmds call made by the library to the active scene backend.
+
+Inside maya the backend is maya.cmds itself. Outside of it (profiling, CI), any
+object exposing the same functions can be plugged in, see fake_cmds.FakeCmds:
+
+    from match_IK_FK.libs import cmds_backend, fake_cmds
+    cmds_backend.setBackend(fake_cmds.FakeCmds())
+"""
+
+try:
+    from maya import cmds as _maya_cmds
+except ImportError:
+    _maya_cmds = None
+
+
+_backend = _maya_cmds
+
+
+def setBackend(backend):
+
+    """Makes the library talk to the given cmds-like object, None goes back to maya.cmds"""
+
+    global _backend
+    _backend = backend if backend is not None else _maya_cmds
+
+
+def getBackend():
+
+    """Returns the cmds-like object currently in use"""
+
+    if _backend is None:
+        raise RuntimeError("No scene backend available, run inside maya or call cmds_backend.setBackend()")
+    return _backend
+
+
+def isMaya():
+
+    """Tells if the active backend is the real maya.cmds"""
+
+    return _backend is not None and _backend is _maya_cmds
+
+
+class _CmdsProxy():
+
+    """Stand-in for the maya.cmds module forwarding attribute lookups to the active backend"""
+
+    def __getattr__(self, name):
+        return getattr(getBackend(), name)
+
+
+cmds = _CmdsProxy()
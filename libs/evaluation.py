@@ -0,0 +1,79 @@
+"""Holds maya's viewport back while a batch writes to the scene, so it redraws once at the end.
+
+Batches nest freely, only the outermost one pauses and resumes the viewport, and only when
+it found it running: a viewport paused by the user or another tool is left paused.
+Suspension can be turned off with setEnabled(False). Outermost batches are timed apart
+with and without it, timings() tells what suspension saved on the same work.
+"""
+
+import time
+from contextlib import contextmanager
+
+from .cmds_backend import cmds
+
+
+_enabled = True
+
+# Batches currently open, the viewport is only paused and resumed by the outermost one
+_depth = 0
+
+# Outermost batches run since resetTimings, and the seconds they took with and without suspension
+_timings = {'batches': 0, 'suspended_seconds': 0.0, 'unsuspended_seconds': 0.0}
+
+
+def setEnabled(enabled):
+
+    """Turns suspension on or off for the batches started from now on"""
+
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def isEnabled():
+
+    """Tells if batches suspend the viewport"""
+
+    return _enabled
+
+
+def timings():
+
+    """Returns the batch count and the seconds batches took with and without suspension since resetTimings.
+
+    Once the same work ran both ways, suspension_saved_seconds tells what suspending saved.
+    """
+
+    result = dict(_timings)
+    result['suspension_saved_seconds'] = result['unsuspended_seconds'] - result['suspended_seconds']
+    return result
+
+
+def resetTimings():
+
+    """Starts timing batches over"""
+
+    _timings.update(batches=0, suspended_seconds=0.0, unsuspended_seconds=0.0)
+
+
+@contextmanager
+def suspendedEvaluation():
+
+    """Pauses the viewport, and the evaluation its redraws pull, inside, restoring it on the way out even on error"""
+
+    global _depth
+    outermost = not _depth
+    # The pause flag toggles, it is only flipped when the viewport was running, and flipped back
+    paused = outermost and _enabled and not cmds.about(batch=True) and not cmds.ogs(q=True, pause=True)
+    if paused:
+        cmds.ogs(pause=True)
+    _depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if paused:
+            cmds.ogs(pause=True)
+        if outermost:
+            _timings['batches'] += 1
+            _timings['suspended_seconds' if _enabled else 'unsuspended_seconds'] += time.perf_counter() - start
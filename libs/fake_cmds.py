@@ -0,0 +1,690 @@
+"""In-memory stand-in for the subset of maya.cmds used by the library.
+
+It keeps a tiny scene graph (transforms, joints, network nodes, string/double
+attributes, keys and parent constraints) so the matching core can run,
+be profiled and be regression tested on machines without a maya licence.
+Only what the library calls is implemented, and animation curves interpolate
+linearly instead of using maya's tangents.
+"""
+
+import collections
+import fnmatch
+import functools
+
+import numpy as np
+
+from . import matrix_utilities
+
+
+# Node types living in the DAG and carrying transform channels
+_TRANSFORM_TYPES = ('transform', 'joint')
+
+# Vector channels of a transform with their short name and default value
+_VECTOR_ATTRIBUTES = {'translate': ('t', 0.0),
+                      'rotate': ('r', 0.0),
+                      'scale': ('s', 1.0),
+                      'jointOrient': ('jo', 0.0),
+                      'rotateAxis': ('ra', 0.0),
+                      'rotatePivot': ('rp', 0.0),
+                      'rotatePivotTranslate': ('rpt', 0.0),
+                      'scalePivot': ('sp', 0.0),
+                      'scalePivotTranslate': ('spt', 0.0)}
+
+# Read-only matrix outputs of a transform with their short name
+_MATRIX_ATTRIBUTES = {'matrix': 'm',
+                      'worldMatrix': 'wm',
+                      'worldInverseMatrix': 'wim',
+                      'parentMatrix': 'pm',
+                      'parentInverseMatrix': 'pim'}
+
+
+def _buildAliases():
+
+    """Maps every short transform attribute name onto its long name"""
+
+    aliases = {'ro': 'rotateOrder', 'v': 'visibility'}
+    for long_name, (short_name, default) in _VECTOR_ATTRIBUTES.items():
+        aliases[short_name] = long_name
+        for axis in 'XYZ':
+            aliases[short_name + axis.lower()] = long_name + axis
+    for long_name, short_name in _MATRIX_ATTRIBUTES.items():
+        aliases[short_name] = long_name
+    return aliases
+
+
+_ALIASES = _buildAliases()
+
+
+def _command(function):
+
+    """Counts every call to a fake command, so benchmarks can report how chatty a code path is"""
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        self.calls[function.__name__] += 1
+        return function(self, *args, **kwargs)
+    return wrapper
+
+
+def _flag(kwargs, *names, default=None):
+
+    """Returns the value of a flag given under any of its names"""
+
+    for name in names:
+        if name in kwargs:
+            return kwargs[name]
+    return default
+
+
+class FakeNode():
+
+    """A node of the fake scene"""
+
+    def __init__(self, name, node_type, parent=None):
+        self.name = name
+        self.type = node_type
+        self.parent = parent
+        self.attributes = {}
+        self.attribute_types = {}
+        self.short_names = {}
+        self.ranges = {}
+        self.locked = set()
+        self.keys = {}
+        self.members = []
+
+        if node_type in _TRANSFORM_TYPES:
+            for long_name, (short_name, default) in _VECTOR_ATTRIBUTES.items():
+                if long_name == 'jointOrient' and node_type != 'joint':
+                    continue
+                for axis in 'XYZ':
+                    self.attributes[long_name + axis] = default
+                    self.attribute_types[long_name + axis] = 'doubleLinear'
+            self.attributes['rotateOrder'] = 0
+            self.attribute_types['rotateOrder'] = 'enum'
+            self.attributes['visibility'] = True
+            self.attribute_types['visibility'] = 'bool'
+
+
+class FakeCmds():
+
+    """Scene graph answering the maya.cmds calls made by the library"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.time = 1.0
+        self.playback_range = (1.0, 120.0)
+        self.selection = []
+        self.refresh_suspended = False
+        self.viewport_paused = False
+        self.calls = collections.Counter()
+        self._world_cache = {}
+        self._callbacks = {}
+        self._next_callback_id = 0
+
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _node(self, name):
+        name = name.split('|')[-1]
+        if name not in self.nodes:
+            raise ValueError("No object matches name: %s" % name)
+        return self.nodes[name]
+
+
+    def _split(self, plug):
+        node_name, attribute = plug.split('.', 1)
+        node = self._node(node_name)
+        # Array indices are irrelevant in the fake scene (no instancing)
+        attribute = attribute.split('[')[0]
+        attribute = node.short_names.get(attribute, _ALIASES.get(attribute, attribute))
+        return node, attribute
+
+
+    def _dirty(self):
+        self._world_cache.clear()
+
+
+    def _emit(self, event, *args):
+        for callback_event, node, function in list(self._callbacks.values()):
+            if callback_event == event and (node is None or node == args[0]):
+                function(*args)
+
+
+    def _value(self, node, attribute, time):
+        keys = node.keys.get(attribute)
+        if not keys:
+            return node.attributes[attribute]
+
+        # Linear interpolation between the surrounding keys, flat outside of them
+        times = sorted(keys)
+        if time <= times[0]:
+            return keys[times[0]]
+        if time >= times[-1]:
+            return keys[times[-1]]
+        index = int(np.searchsorted(times, time))
+        before, after = times[index - 1], times[index]
+        weight = (time - before) / (after - before)
+        return keys[before] + (keys[after] - keys[before]) * weight
+
+
+    def _vector(self, node, attribute, time):
+        return [self._value(node, attribute + axis, time) for axis in 'XYZ']
+
+
+    def _localMatrix(self, node, time):
+        # Maya composes a joint as [S][RA][R][JO][T], and a transform as
+        # [-SP][S][SP][SPT][-RP][RA][R][RP][RPT][T], shear is left out
+        rotation = matrix_utilities.eulerToRotations(self._vector(node, 'rotate', time),
+                                                     int(self._value(node, 'rotateOrder', time)))
+        rotation = matrix_utilities.eulerToRotations(self._vector(node, 'rotateAxis', time), 0) @ rotation
+        scale = np.array(self._vector(node, 'scale', time))
+        translate = np.array(self._vector(node, 'translate', time))
+        if node.type == 'joint':
+            rotation = rotation @ matrix_utilities.eulerToRotations(self._vector(node, 'jointOrient', time), 0)
+        else:
+            rotate_pivot = np.array(self._vector(node, 'rotatePivot', time))
+            scale_pivot = np.array(self._vector(node, 'scalePivot', time))
+            pivot_offset = (scale_pivot - scale_pivot * scale + np.array(self._vector(node, 'scalePivotTranslate', time))
+                            - rotate_pivot)
+            translate = (translate + pivot_offset @ rotation + rotate_pivot
+                         + np.array(self._vector(node, 'rotatePivotTranslate', time)))
+
+        matrix = np.identity(4)
+        matrix[:3, :3] = np.diag(scale) @ rotation
+        matrix[3, :3] = translate
+        return matrix
+
+
+    def _parentMatrix(self, node, time):
+        if node.parent is None:
+            return np.identity(4)
+        return self._worldMatrix(node.parent, time)
+
+
+    def _worldMatrix(self, node, time):
+        key = (node.name, time)
+        if key not in self._world_cache:
+            self._world_cache[key] = self._localMatrix(node, time) @ self._parentMatrix(node, time)
+        return self._world_cache[key]
+
+
+    def _longName(self, node):
+        if node.type not in _TRANSFORM_TYPES:
+            return node.name
+        names = []
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return '|' + '|'.join(reversed(names))
+
+
+    def _uniqueName(self, name):
+        if name not in self.nodes:
+            return name
+        stem = name.rstrip('0123456789')
+        index = 1
+        while '%s%d' % (stem, index) in self.nodes:
+            index += 1
+        return '%s%d' % (stem, index)
+
+
+    def _setChannels(self, node, matrix):
+        # Write back a local matrix into translate and rotate, ignoring joint orient and rotate axis
+        rotate_order = int(node.attributes['rotateOrder'])
+        translates, rotates, scales = matrix_utilities.decomposeMatrices(matrix, rotate_order)
+        for axis, translate, rotate in zip('XYZ', translates, rotates):
+            node.attributes['translate' + axis] = float(translate)
+            node.attributes['rotate' + axis] = float(rotate)
+        self._dirty()
+
+
+    # ------------------------------------------------------------------
+    # Nodes
+    # ------------------------------------------------------------------
+
+    @_command
+    def createNode(self, node_type, **kwargs):
+        name = self._uniqueName(_flag(kwargs, 'name', 'n', default=node_type + '1'))
+        parent = _flag(kwargs, 'parent', 'p')
+        self.nodes[name] = FakeNode(name, node_type, self._node(parent) if parent else None)
+        self._dirty()
+        self._emit('nodeAdded', name, node_type)
+        return name
+
+
+    @_command
+    def objExists(self, name):
+        try:
+            if '.' in name:
+                node, attribute = self._split(name)
+                return attribute in node.attributes
+            self._node(name)
+        except ValueError:
+            return False
+        return True
+
+
+    @_command
+    def ls(self, *args, **kwargs):
+        node_type = _flag(kwargs, 'type', 'typ')
+        long_names = _flag(kwargs, 'long', 'l', default=False)
+
+        # Gather the patterns to match
+        patterns = []
+        for arg in args:
+            patterns.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+
+        if _flag(kwargs, 'selection', 'sl', default=False):
+            # Deleted nodes drop out of the selection
+            nodes = [node for node in self.selection if self.nodes.get(node.name) is node]
+        elif patterns:
+            nodes = []
+            recursive = _flag(kwargs, 'recursive', 'r', default=False)
+            for pattern in patterns:
+                pattern = pattern.split('|')[-1]
+                if pattern in self.nodes and not recursive:
+                    nodes.append(self.nodes[pattern])
+                    continue
+                names = fnmatch.filter(self.nodes, pattern)
+                # Recursive patterns also look inside every namespace
+                if recursive and ':' not in pattern:
+                    matched = set(names)
+                    names += [name for name in fnmatch.filter(self.nodes, '*:' + pattern) if name not in matched]
+                nodes.extend(self.nodes[name] for name in names)
+        else:
+            nodes = list(self.nodes.values())
+
+        if node_type is not None:
+            node_types = node_type if isinstance(node_type, (list, tuple)) else [node_type]
+            nodes = [node for node in nodes if node.type in node_types]
+        return [self._longName(node) if long_names else node.name for node in nodes]
+
+
+    @_command
+    def select(self, *args, **kwargs):
+        nodes = []
+        for arg in args:
+            nodes.extend(self._node(name) for name in (arg if isinstance(arg, (list, tuple)) else [arg]))
+
+        if _flag(kwargs, 'clear', 'cl', default=False):
+            self.selection = []
+        elif _flag(kwargs, 'add', default=False):
+            self.selection.extend(node for node in nodes if node not in self.selection)
+        elif _flag(kwargs, 'deselect', 'd', default=False):
+            self.selection = [node for node in self.selection if node not in nodes]
+        else:
+            self.selection = nodes
+
+
+    @_command
+    def nodeType(self, name):
+        return self._node(name).type
+
+
+    @_command
+    def listRelatives(self, name, **kwargs):
+        node = self._node(name)
+        full_path = _flag(kwargs, 'fullPath', 'f', default=False)
+        if _flag(kwargs, 'parent', 'p', default=False):
+            relatives = [node.parent] if node.parent is not None else []
+        else:
+            relatives = [child for child in self.nodes.values() if child.parent is node]
+        if not relatives:
+            return None
+        return [self._longName(relative) if full_path else relative.name for relative in relatives]
+
+
+    @_command
+    def rename(self, name, new_name):
+        node = self._node(name)
+        old_name = node.name
+        new_name = self._uniqueName(new_name)
+        del self.nodes[old_name]
+        node.name = new_name
+        self.nodes[new_name] = node
+        for object_set in self.nodes.values():
+            object_set.members = [new_name if member == old_name else member for member in object_set.members]
+        self._dirty()
+        self._emit('nodeRenamed', new_name, old_name, node.type)
+        return new_name
+
+
+    @_command
+    def delete(self, *args):
+        names = []
+        for arg in args:
+            names.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+
+        for name in names:
+            node = self._node(name)
+            # Children go away with their parent
+            children = [child.name for child in self.nodes.values() if child.parent is node]
+            if children:
+                self.delete(children)
+            del self.nodes[node.name]
+            for object_set in self.nodes.values():
+                if node.name in object_set.members:
+                    object_set.members.remove(node.name)
+            self._emit('nodeRemoved', node.name, node.type)
+        self._dirty()
+
+
+    @_command
+    def sets(self, *args, **kwargs):
+        names = []
+        for arg in args:
+            names.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+
+        if _flag(kwargs, 'query', 'q', default=False):
+            return list(self._node(names[0]).members) or None
+
+        add = _flag(kwargs, 'add', 'addElement')
+        if add is not None:
+            object_set = self._node(add)
+            object_set.members.extend(self._node(name).name for name in names if self._node(name).name not in object_set.members)
+            return None
+
+        remove = _flag(kwargs, 'remove', 'rm')
+        if remove is not None:
+            object_set = self._node(remove)
+            object_set.members = [member for member in object_set.members if member not in names]
+            return None
+
+        # Create a new set from the given members
+        object_set = self.createNode('objectSet', name=_flag(kwargs, 'name', 'n', default='set1'))
+        if not _flag(kwargs, 'empty', default=False):
+            self.nodes[object_set].members = [self._node(name).name for name in names]
+        return object_set
+
+
+    # ------------------------------------------------------------------
+    # Attributes
+    # ------------------------------------------------------------------
+
+    @_command
+    def addAttr(self, target, **kwargs):
+        if _flag(kwargs, 'query', 'q', default=False):
+            node, attribute = self._split(target)
+            minimum, maximum = node.ranges.get(attribute, (None, None))
+            if _flag(kwargs, 'minValue', 'min', default=False):
+                return minimum
+            if _flag(kwargs, 'maxValue', 'max', default=False):
+                return maximum
+            return None
+
+        node = self._node(target)
+        long_name = _flag(kwargs, 'longName', 'ln')
+        short_name = _flag(kwargs, 'shortName', 'sn')
+        name = long_name or short_name
+        if name in node.attributes:
+            raise RuntimeError("Found attribute %s.%s already exists" % (node.name, name))
+        if short_name and short_name != name:
+            node.short_names[short_name] = name
+
+        data_type = _flag(kwargs, 'dataType', 'dt')
+        attribute_type = _flag(kwargs, 'attributeType', 'at', default='double')
+        node.attribute_types[name] = data_type or attribute_type
+        if data_type == 'string':
+            node.attributes[name] = None
+        elif data_type == 'matrix':
+            node.attributes[name] = list(np.identity(4).flatten())
+        else:
+            node.attributes[name] = _flag(kwargs, 'defaultValue', 'dv', default=0.0)
+        node.ranges[name] = (_flag(kwargs, 'minValue', 'min'), _flag(kwargs, 'maxValue', 'max'))
+
+
+    @_command
+    def attributeQuery(self, attribute, **kwargs):
+        node = self._node(_flag(kwargs, 'node', 'n'))
+        attribute = node.short_names.get(attribute, _ALIASES.get(attribute, attribute))
+        if _flag(kwargs, 'exists', 'ex', default=False):
+            return attribute in node.attributes or attribute in _VECTOR_ATTRIBUTES or attribute in _MATRIX_ATTRIBUTES
+        raise NotImplementedError("attributeQuery only supports the exists flag")
+
+
+    @_command
+    def getAttr(self, plug, **kwargs):
+        node, attribute = self._split(plug)
+        time = _flag(kwargs, 'time', 't', default=self.time)
+
+        if _flag(kwargs, 'lock', 'l', default=False):
+            return attribute in node.locked
+        if _flag(kwargs, 'type', default=False):
+            return node.attribute_types.get(attribute, 'double3' if attribute in _VECTOR_ATTRIBUTES else 'matrix')
+
+        if attribute in _VECTOR_ATTRIBUTES:
+            # Joint only channels do not exist on transforms
+            if attribute + 'X' not in node.attributes:
+                raise ValueError("No object matches name: %s" % plug)
+            return [tuple(float(value) for value in self._vector(node, attribute, time))]
+
+        if attribute in _MATRIX_ATTRIBUTES:
+            if attribute == 'matrix':
+                matrix = self._localMatrix(node, time)
+            elif attribute == 'worldMatrix':
+                matrix = self._worldMatrix(node, time)
+            elif attribute == 'worldInverseMatrix':
+                matrix = np.linalg.inv(self._worldMatrix(node, time))
+            elif attribute == 'parentMatrix':
+                matrix = self._parentMatrix(node, time)
+            else:
+                matrix = np.linalg.inv(self._parentMatrix(node, time))
+            return [float(value) for value in matrix.flatten()]
+
+        if attribute not in node.attributes:
+            raise ValueError("No object matches name: %s" % plug)
+        value = self._value(node, attribute, time)
+        if node.attribute_types.get(attribute) in ('doubleLinear', 'double', 'doubleAngle', 'float'):
+            return float(value)
+        return value
+
+
+    @_command
+    def setAttr(self, plug, *values, **kwargs):
+        node, attribute = self._split(plug)
+
+        lock = _flag(kwargs, 'lock', 'l')
+        if lock is not None:
+            node.locked.add(attribute) if lock else node.locked.discard(attribute)
+            if not values:
+                return
+
+        if attribute in _VECTOR_ATTRIBUTES:
+            channels = [attribute + axis for axis in 'XYZ']
+        else:
+            channels = [attribute]
+
+        for channel, value in zip(channels, values):
+            if channel in node.locked or attribute in node.locked:
+                raise RuntimeError("The attribute '%s.%s' is locked or connected and cannot be modified." % (node.name, channel))
+            if channel not in node.attributes:
+                raise ValueError("No object matches name: %s.%s" % (node.name, channel))
+            node.attributes[channel] = value
+        self._dirty()
+        self._emit('attributeChanged', node.name, attribute)
+
+
+    @_command
+    def listAttr(self, name, **kwargs):
+        node = self._node(name)
+        attributes = list(node.attributes)
+        if _flag(kwargs, 'locked', 'l', default=False):
+            # Compounds are not stored as attributes but can be locked too
+            attributes = [attribute for attribute in attributes + list(_VECTOR_ATTRIBUTES) if attribute in node.locked]
+        if _flag(kwargs, 'userDefined', 'ud', default=False):
+            attributes = [attribute for attribute in attributes if node.attribute_types[attribute] not in ('doubleLinear', 'enum', 'bool')]
+        return attributes or None
+
+
+    # ------------------------------------------------------------------
+    # Time and animation
+    # ------------------------------------------------------------------
+
+    @_command
+    def currentTime(self, *args, **kwargs):
+        if _flag(kwargs, 'query', 'q', default=False):
+            return self.time
+        self.time = float(args[0] if args else _flag(kwargs, 'time'))
+        return self.time
+
+
+    @_command
+    def playbackOptions(self, **kwargs):
+        if _flag(kwargs, 'query', 'q', default=False):
+            if _flag(kwargs, 'minTime', 'min', default=False):
+                return self.playback_range[0]
+            if _flag(kwargs, 'maxTime', 'max', default=False):
+                return self.playback_range[1]
+            return None
+
+        start = _flag(kwargs, 'minTime', 'min', default=self.playback_range[0])
+        end = _flag(kwargs, 'maxTime', 'max', default=self.playback_range[1])
+        self.playback_range = (float(start), float(end))
+
+
+    @_command
+    def setKeyframe(self, name, **kwargs):
+        node = self._node(name)
+        attribute = _flag(kwargs, 'attribute', 'at')
+        attribute = node.short_names.get(attribute, _ALIASES.get(attribute, attribute))
+        time = float(_flag(kwargs, 'time', 't', default=self.time))
+        value = _flag(kwargs, 'value', 'v')
+        if value is None:
+            value = self._value(node, attribute, time)
+        node.keys.setdefault(attribute, {})[time] = value
+        self._dirty()
+        return 1
+
+
+    @_command
+    def cutKey(self, name, **kwargs):
+        if not _flag(kwargs, 'clear', 'cl', default=False):
+            raise NotImplementedError("Only cutKey(clear=True) is supported, there is no clipboard")
+        node = self._node(name)
+        attribute = _flag(kwargs, 'attribute', 'at')
+        attribute = node.short_names.get(attribute, _ALIASES.get(attribute, attribute))
+        start, end = _flag(kwargs, 'time', 't', default=(float('-inf'), float('inf')))
+        keys = node.keys.get(attribute, {})
+        for time in [time for time in keys if start <= time <= end]:
+            del keys[time]
+        self._dirty()
+        return 1
+
+
+    @_command
+    def keyframe(self, name, **kwargs):
+        if not _flag(kwargs, 'query', 'q', default=False) or not _flag(kwargs, 'timeChange', 'tc', default=False):
+            raise NotImplementedError("Only keyframe(q=True, timeChange=True) is supported")
+        node = self._node(name)
+        attribute = _flag(kwargs, 'attribute', 'at')
+        if attribute is not None:
+            attribute = node.short_names.get(attribute, _ALIASES.get(attribute, attribute))
+            curves = [node.keys.get(attribute, {})]
+        else:
+            curves = node.keys.values()
+        # One entry per key of every curve, like maya
+        times = [time for keys in curves for time in sorted(keys)]
+        return times or None
+
+
+    # ------------------------------------------------------------------
+    # Constraints
+    # ------------------------------------------------------------------
+
+    @_command
+    def parentConstraint(self, *args, **kwargs):
+        # Like in maya, the driven channels snap as soon as the constraint exists and stay there once it is deleted
+        source, target = self._node(args[0]), self._node(args[1])
+        maintain_offset = _flag(kwargs, 'maintainOffset', 'mo', default=False)
+
+        world_matrix = self._worldMatrix(source, self.time)
+        if maintain_offset:
+            world_matrix = self._worldMatrix(target, self.time)
+        local_matrix = world_matrix @ np.linalg.inv(self._parentMatrix(target, self.time))
+        self._setChannels(target, local_matrix)
+
+        constraint = self.createNode('parentConstraint',
+                                     name=_flag(kwargs, 'name', 'n', default=target.name + '_parentConstraint1'),
+                                     parent=target.name)
+        return [constraint]
+
+
+    # ------------------------------------------------------------------
+    # Scene
+    # ------------------------------------------------------------------
+
+    @_command
+    def file(self, *args, **kwargs):
+        if not _flag(kwargs, 'new', default=False):
+            raise NotImplementedError("file only supports the new flag")
+        self.nodes.clear()
+        self.time = 1.0
+        self._dirty()
+        self._emit('sceneChanged')
+
+
+    def addCallback(self, event, function, node=None):
+
+        """Calls function on a scene event, standing in for maya's OpenMaya messages.
+
+        Events are sceneChanged(), nodeAdded(name, type), nodeRemoved(name, type),
+        nodeRenamed(name, old_name, type) and attributeChanged(node, attribute).
+        Passing a node only reports the events of that node.
+        """
+
+        self._next_callback_id += 1
+        self._callbacks[self._next_callback_id] = (event, node, function)
+        return self._next_callback_id
+
+
+    def removeCallback(self, callback_id):
+
+        """Removes a callback added with addCallback"""
+
+        self._callbacks.pop(callback_id, None)
+
+
+    # ------------------------------------------------------------------
+    # Interface
+    # ------------------------------------------------------------------
+
+    @_command
+    def error(self, message):
+        raise RuntimeError(message)
+
+
+    @_command
+    def warning(self, message):
+        print("Warning: %s" % message)
+
+
+    @_command
+    def undoInfo(self, **kwargs):
+        return True
+
+
+    @_command
+    def refresh(self, **kwargs):
+        # Like in maya, refresh has no query mode
+        if _flag(kwargs, 'query', 'q', default=False):
+            raise TypeError("Invalid flag 'query'")
+        suspend = _flag(kwargs, 'suspend', 'su')
+        if suspend is not None:
+            self.refresh_suspended = bool(suspend)
+
+
+    @_command
+    def ogs(self, **kwargs):
+        # Like in maya, the pause flag toggles the viewport pause and can be queried
+        if _flag(kwargs, 'query', 'q', default=False):
+            return self.viewport_paused
+        if _flag(kwargs, 'pause', 'p', default=False):
+            self.viewport_paused = not self.viewport_paused
+
+
+    @_command
+    def about(self, **kwargs):
+        # The fake scene stands in for an interactive session
+        return False
@@ -0,0 +1,136 @@
+"""Spreads frame independent numpy work over a pool of processes, sharing the arrays instead of pickling them.
+
+Only the solving runs in the pool: the scene is sampled beforehand and written afterwards
+by the calling process. Inside maya the workers run on mayapy, found in maya's bin folder.
+"""
+
+import concurrent.futures
+import contextlib
+import multiprocessing
+import multiprocessing.spawn
+import os
+import sys
+from multiprocessing import shared_memory
+import numpy as np
+
+from . import cmds_backend
+
+
+# State of a worker process, set once by _initWorker
+_worker = None
+
+
+def mapFrames(function, static_args, inputs, output_shapes, processes=None, min_chunk=1):
+
+    """Calls function(*static_args, *input_chunks) on chunks of frames and merges what it returns in frame order.
+
+    inputs are arrays sharing their first (frames) axis, the function returns one array per
+    output shape for the frames it gets. Chunks hold at least min_chunk frames, and
+    processes defaults to the cpu count. When a single chunk remains, the function is simply
+    called in this process.
+    """
+
+    frame_count = len(inputs[0])
+    processes = processes or os.cpu_count() or 1
+    chunk_count = min(processes, frame_count // max(min_chunk, 1))
+    if chunk_count < 2:
+        return function(*static_args, *inputs)
+
+    blocks = []
+    outputs = []
+    try:
+        # Inputs and outputs live in shared memory, only their names go through the pool
+        input_specs = [_share(np.ascontiguousarray(array, dtype=np.float64), blocks)[0] for array in inputs]
+        outputs = [_share(np.zeros(shape), blocks) for shape in output_shapes]
+        output_specs = [spec for spec, array in outputs]
+
+        bounds = np.linspace(0, frame_count, chunk_count + 1).astype(int)
+        with _context() as context:
+            with concurrent.futures.ProcessPoolExecutor(chunk_count, mp_context=context, initializer=_initWorker,
+                                                        initargs=(function, static_args, input_specs,
+                                                                  output_specs)) as pool:
+                # Going through the results raises what failed in the workers
+                list(pool.map(_solveChunk, bounds[:-1].tolist(), bounds[1:].tolist()))
+        return tuple(array.copy() for spec, array in outputs)
+    finally:
+        # Blocks can't close while arrays still point into them
+        del outputs[:]
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _share(array, blocks):
+
+    """Copies an array into a new shared memory block, returns its (name, shape) spec and the shared array"""
+
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    shared_array = np.ndarray(array.shape, dtype=np.float64, buffer=block.buf)
+    shared_array[...] = array
+    return (block.name, array.shape), shared_array
+
+
+def _attach(spec, blocks):
+
+    """Maps the shared memory block of a spec into this process"""
+
+    name, shape = spec
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+@contextlib.contextmanager
+def _context():
+
+    """Yields the multiprocessing context of the pool, spawning mayapy processes inside maya.
+
+    The spawn executable is set for the whole process, so it is put back once the pool is done.
+    """
+
+    context = multiprocessing.get_context('spawn')
+    if not cmds_backend.isMaya():
+        yield context
+        return
+
+    previous = multiprocessing.spawn.get_executable()
+    context.set_executable(_mayapyPath())
+    try:
+        yield context
+    finally:
+        context.set_executable(previous)
+
+
+def _mayapyPath():
+
+    """Returns the path of mayapy, which sits in maya's bin folder on every platform"""
+
+    # sys.executable is the maya binary there, which would open another maya, and on macOS
+    # it lives in Maya.app/Contents/MacOS rather than next to mayapy in Contents/bin
+    executable = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+    maya_location = os.environ.get('MAYA_LOCATION')
+    if maya_location:
+        return os.path.join(maya_location, 'bin', executable)
+    return os.path.join(os.path.dirname(sys.executable), executable)
+
+
+def _initWorker(function, static_args, input_specs, output_specs):
+
+    """Attaches a worker process to the shared arrays once, before it solves any chunk"""
+
+    global _worker
+    blocks = []
+    inputs = [_attach(spec, blocks) for spec in input_specs]
+    outputs = [_attach(spec, blocks) for spec in output_specs]
+    _worker = (function, static_args, inputs, outputs, blocks)
+
+
+def _solveChunk(first, last):
+
+    """Runs the function on a range of frames, writing its results straight into the shared outputs"""
+
+    function, static_args, inputs, outputs, blocks = _worker
+    results = function(*static_args, *[array[first:last] for array in inputs])
+    for output, result in zip(outputs, results):
+        output[first:last] = result
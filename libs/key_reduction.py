@@ -0,0 +1,61 @@
+"""Drops the baked keys that linear interpolation of the remaining keys already rebuilds within a tolerance."""
+
+import numpy as np
+
+
+def reduceKeys(frames, values, tolerance):
+
+    """Picks the keys to keep on (frames, ...) baked curves, every trailing index being its own curve.
+
+    Works like Douglas-Peucker run on every curve at once: each pass keeps the worst frame
+    of every segment out of tolerance, until linear interpolation between kept keys stays
+    within it everywhere. Returns a keep mask shaped like values and the largest error
+    left on each curve.
+    """
+
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    curves = values.reshape(len(frames), int(np.prod(values.shape[1:])))
+    keep = np.zeros(curves.shape, dtype=bool)
+    errors = np.zeros(curves.shape)
+
+    # Both ends of the range are always kept
+    keep[:1] = True
+    keep[-1:] = True
+    rows = np.arange(len(frames))[:, None]
+    columns = np.arange(curves.shape[1])
+
+    while True:
+        errors = np.abs(_interpolateKept(frames, curves, keep) - curves)
+        over = np.flatnonzero(errors > tolerance)
+        if not len(over):
+            break
+
+        # Segments are named after the kept key opening them, unique across curves
+        previous = np.maximum.accumulate(np.where(keep, rows, 0), axis=0)
+        segments = (previous * curves.shape[1] + columns).ravel()[over]
+
+        # Worst frame first within each segment, then keep the first of every segment
+        order = np.lexsort((-errors.ravel()[over], segments))
+        over = over[order]
+        segments = segments[order]
+        first = np.ones(len(over), dtype=bool)
+        first[1:] = segments[1:] != segments[:-1]
+        keep.ravel()[over[first]] = True
+
+    return keep.reshape(values.shape), errors.max(axis=0, initial=0.0).reshape(values.shape[1:])
+
+
+def _interpolateKept(frames, curves, keep):
+
+    """Rebuilds (frames, curves) values by linear interpolation between the kept keys of each curve"""
+
+    rows = np.arange(len(frames))[:, None]
+    previous = np.maximum.accumulate(np.where(keep, rows, 0), axis=0)
+    following = np.minimum.accumulate(np.where(keep, rows, len(frames) - 1)[::-1], axis=0)[::-1]
+
+    spans = frames[following] - frames[previous]
+    weights = (frames[:, None] - frames[previous]) / np.where(spans > 0.0, spans, 1.0)
+    previous_values = np.take_along_axis(curves, previous, axis=0)
+    following_values = np.take_along_axis(curves, following, axis=0)
+    return previous_values + (following_values - previous_values) * weights
@@ -0,0 +1,154 @@
+import json
+from dataclasses import asdict, dataclass, fields, replace
+
+from .cmds_backend import cmds
+
+
+# Version of the packed layout, bump it whenever fields change
+RECORD_VERSION = 4
+
+# Older versions still read, missing fields keep their defaults
+SUPPORTED_VERSIONS = (1, 2, 3, 4)
+
+# Single string attribute holding the packed record on a _DATA node
+RECORD_ATTRIBUTE = 'limb_data'
+
+# Attributes of the original one-string-per-field layout
+LEGACY_ATTRIBUTES = ('blend_attr', 'fk_blend_value', 'ik_blend_value',
+                     'ik_control_01', 'ik_control_02', 'ik_control_03',
+                     'ik_joint_01', 'ik_joint_02', 'ik_joint_03',
+                     'fk_control_01', 'fk_control_02', 'fk_control_03',
+                     'fk_joint_01', 'fk_joint_02', 'fk_joint_03')
+
+
+@dataclass(frozen=True)
+class LimbRecord():
+
+    """Everything needed to match a limb, as stored on its _DATA node"""
+
+    blend_attr: str
+    fk_blend_value: float
+    ik_blend_value: float
+    ik_controls: tuple
+    ik_joints: tuple
+    fk_controls: tuple
+    fk_joints: tuple
+    ik_offsets: tuple = None
+    fk_offsets: tuple = None
+    pole_index: int = 1
+    pole_distance: float = None
+    # Templates hold namespace-free names and serve every namespace the rig is referenced under
+    template: bool = False
+
+
+    def encode(self):
+
+        """Packs the record into a versioned JSON string"""
+
+        data = asdict(self)
+        data['version'] = RECORD_VERSION
+        return json.dumps(data)
+
+
+    @classmethod
+    def decode(cls, text):
+
+        """Unpacks a JSON string written by encode()"""
+
+        data = json.loads(text)
+        version = data.pop('version', None)
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError("Unsupported limb record version: %s" % version)
+
+        for field in fields(cls):
+            if field.type is tuple and data.get(field.name) is not None:
+                data[field.name] = _toTuple(data[field.name])
+        return cls(**data)
+
+
+    def asTemplate(self):
+
+        """Returns the record with namespaces stripped from every name, serving any instance of the rig"""
+
+        return self._renamed(stripNamespace, template=True)
+
+
+    def bind(self, namespace):
+
+        """Returns the record of the instance of a template living in a namespace"""
+
+        return self._renamed(lambda name: addNamespace(name, namespace), template=False)
+
+
+    def _renamed(self, rename, **changes):
+
+        """Returns a copy of the record with every node name passed through a function"""
+
+        node, attribute = self.blend_attr.split('.', 1)
+        return replace(self,
+                       blend_attr='%s.%s' % (rename(node), attribute),
+                       ik_controls=tuple(rename(name) for name in self.ik_controls),
+                       ik_joints=tuple(rename(name) for name in self.ik_joints),
+                       fk_controls=tuple(rename(name) for name in self.fk_controls),
+                       fk_joints=tuple(rename(name) for name in self.fk_joints),
+                       **changes)
+
+
+def stripNamespace(name):
+
+    """Removes the namespaces from a node name or DAG path"""
+
+    return '|'.join(part.rpartition(':')[2] for part in name.split('|'))
+
+
+def addNamespace(name, namespace):
+
+    """Puts a node name or DAG path in a namespace, the root namespace leaves it as is"""
+
+    if not namespace:
+        return name
+    return '|'.join('%s:%s' % (namespace, part) if part else part for part in name.split('|'))
+
+
+def _toTuple(value):
+
+    """Turns nested JSON lists back into nested tuples"""
+
+    if isinstance(value, list):
+        return tuple(_toTuple(item) for item in value)
+    return value
+
+
+def writeLimbRecord(node, record):
+
+    """Stores a record on a node, adding the attribute when needed"""
+
+    if not cmds.attributeQuery(RECORD_ATTRIBUTE, node=node, exists=True):
+        cmds.addAttr(node, ln=RECORD_ATTRIBUTE, dt='string')
+    cmds.setAttr('%s.%s' % (node, RECORD_ATTRIBUTE), record.encode(), type='string')
+
+
+def readLimbRecord(node):
+
+    """Reads the record of a _DATA node in one query, falling back on the legacy layout"""
+
+    try:
+        text = cmds.getAttr('%s.%s' % (node, RECORD_ATTRIBUTE))
+    except ValueError:
+        return _readLegacyLimbRecord(node)
+    return LimbRecord.decode(text)
+
+
+def _readLegacyLimbRecord(node):
+
+    """Reads a _DATA node written with one string attribute per field"""
+
+    values = {attribute: cmds.getAttr('%s.%s' % (node, attribute)) for attribute in LEGACY_ATTRIBUTES}
+
+    return LimbRecord(blend_attr=values['blend_attr'],
+                      fk_blend_value=float(values['fk_blend_value']),
+                      ik_blend_value=float(values['ik_blend_value']),
+                      ik_controls=tuple(values['ik_control_%02d' % i] for i in (1, 2, 3)),
+                      ik_joints=tuple(values['ik_joint_%02d' % i] for i in (1, 2, 3)),
+                      fk_controls=tuple(values['fk_control_%02d' % i] for i in (1, 2, 3)),
+                      fk_joints=tuple(values['fk_joint_%02d' % i] for i in (1, 2, 3)))
@@ -0,0 +1,321 @@
+from . import cmds_backend
+from . import limb_record
+from .cmds_backend import cmds
+
+
+# Suffix of the network nodes holding limb records
+DATA_SUFFIX = '_DATA'
+
+# Object set gathering every limb node, so discovery never walks foreign network nodes
+LIMB_SET = 'matchIkFk_LIMBS'
+
+# Marker attribute identifying limb nodes
+LIMB_TAG = 'matchIkFkLimb'
+
+
+class _MayaSceneEvents():
+
+    """Exposes maya's OpenMaya messages with the addCallback/removeCallback interface of fake_cmds.FakeCmds"""
+
+    def __init__(self):
+        import maya.api.OpenMaya as om
+        self.om = om
+
+
+    def _name(self, node):
+        return self.om.MFnDependencyNode(node).name()
+
+
+    def addCallback(self, event, function, node=None):
+        om = self.om
+
+        if event == 'sceneChanged':
+            messages = (om.MSceneMessage.kAfterNew, om.MSceneMessage.kAfterOpen,
+                        om.MSceneMessage.kAfterImport, om.MSceneMessage.kAfterCreateReference,
+                        om.MSceneMessage.kAfterRemoveReference, om.MSceneMessage.kAfterLoadReference,
+                        om.MSceneMessage.kAfterUnloadReference)
+            return [om.MSceneMessage.addCallback(message, lambda *args: function()) for message in messages]
+
+        # Only limb nodes and the limb set matter, so leave every other node type unwatched
+        if event == 'nodeAdded':
+            return [om.MDGMessage.addNodeAddedCallback(
+                lambda obj, *args, node_type=node_type: function(self._name(obj), node_type), node_type)
+                for node_type in ('network', 'objectSet')]
+
+        if event == 'nodeRemoved':
+            return [om.MDGMessage.addNodeRemovedCallback(
+                lambda obj, *args, node_type=node_type: function(self._name(obj), node_type), node_type)
+                for node_type in ('network', 'objectSet')]
+
+        if event == 'nodeRenamed':
+            # A null object listens to every node of the scene
+            return [om.MNodeMessage.addNameChangedCallback(
+                om.MObject(),
+                lambda obj, old_name, *args: function(self._name(obj), old_name, om.MFnDependencyNode(obj).typeName))]
+
+        if event == 'attributeChanged':
+            selection = om.MSelectionList()
+            selection.add(node)
+
+            def attributeChanged(message, plug, *args):
+                if message & om.MNodeMessage.kAttributeSet:
+                    function(node, plug.partialName(useLongNames=True))
+
+            return [om.MNodeMessage.addAttributeChangedCallback(selection.getDependNode(0), attributeChanged)]
+
+        raise ValueError("Unknown scene event: %s" % event)
+
+
+    def removeCallback(self, callback_ids):
+        self.om.MMessage.removeCallbacks(callback_ids)
+
+
+class LimbRegistry():
+
+    """Process-wide cache of the limbs saved in the scene.
+
+    Records are decoded once and kept until their _DATA node is added, removed, renamed
+    or edited, or the scene changes. The instances of template limbs are listed once and
+    kept until the scene changes (references loaded or removed, imports, new scenes).
+    Backends without scene events are never cached.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._events = None
+        self._scene_callbacks = []
+        self._node_callbacks = {}
+        self._names = None
+        self._records = {}
+        self._instances = {}
+
+
+    def names(self):
+
+        """Lists the limbs saved in the scene"""
+
+        self._connect()
+        if self._names is None or self._events is None:
+            self._names = _discoverLimbs()
+        return list(self._names)
+
+
+    def record(self, name):
+
+        """Returns the decoded record of a limb"""
+
+        self._connect()
+        if name not in self._records or self._events is None:
+            node = name + DATA_SUFFIX
+            self._records[name] = _referencedRecord(name, limb_record.readLimbRecord(node))
+            self._watchNode(node)
+        return self._records[name]
+
+
+    def instances(self, name):
+
+        """Lists the namespaces a template limb is instanced under, the root namespace being ''"""
+
+        self._connect()
+        if name not in self._instances or self._events is None:
+            self._instances[name] = _discoverInstances(self.record(name))
+        return list(self._instances[name])
+
+
+    def invalidate(self, name=None):
+
+        """Forgets a limb, or everything when no name is given"""
+
+        if name is None:
+            self._names = None
+            self._records.clear()
+            self._instances.clear()
+            self._unwatchNodes()
+        else:
+            self._records.pop(name, None)
+            self._instances.pop(name, None)
+            self._unwatchNodes(name + DATA_SUFFIX)
+
+
+    def uninstall(self):
+
+        """Removes every callback and empties the cache"""
+
+        self.invalidate()
+        if self._events is not None:
+            for callback_ids in self._scene_callbacks:
+                self._events.removeCallback(callback_ids)
+        self._scene_callbacks = []
+        self._events = None
+        self._backend = None
+
+
+    # ------------------------------------------------------------------
+    # Scene events
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+
+        """Listens to the scene of the active backend, starting over when the backend changed"""
+
+        backend = cmds_backend.getBackend()
+        if backend is self._backend:
+            return
+
+        self.uninstall()
+        self._backend = backend
+        if cmds_backend.isMaya():
+            self._events = _MayaSceneEvents()
+        elif hasattr(backend, 'addCallback'):
+            self._events = backend
+        else:
+            return
+
+        self._scene_callbacks = [self._events.addCallback('sceneChanged', self._onSceneChanged),
+                                 self._events.addCallback('nodeAdded', self._onNodeAdded),
+                                 self._events.addCallback('nodeRemoved', self._onNodeRemoved),
+                                 self._events.addCallback('nodeRenamed', self._onNodeRenamed)]
+
+
+    def _watchNode(self, node):
+        if self._events is not None and node not in self._node_callbacks:
+            self._node_callbacks[node] = self._events.addCallback('attributeChanged', self._onAttributeChanged, node=node)
+
+
+    def _unwatchNodes(self, node=None):
+        nodes = list(self._node_callbacks) if node is None else [node]
+        for node in nodes:
+            if node in self._node_callbacks:
+                self._events.removeCallback(self._node_callbacks.pop(node))
+
+
+    def _onSceneChanged(self):
+        self.invalidate()
+
+
+    def _onNodeAdded(self, node, node_type):
+        if node_type in ('network', 'objectSet'):
+            self._names = None
+
+
+    def _onNodeRemoved(self, node, node_type):
+        if node_type == 'objectSet' and _isLimbSet(node):
+            self._names = None
+        elif node_type == 'network':
+            self._names = None
+            self.invalidate(node.removesuffix(DATA_SUFFIX))
+
+
+    def _onNodeRenamed(self, node, old_name, node_type):
+        if node_type == 'network':
+            self._names = None
+            self.invalidate(old_name.removesuffix(DATA_SUFFIX))
+
+
+    def _onAttributeChanged(self, node, attribute):
+        self.invalidate(node.removesuffix(DATA_SUFFIX))
+
+
+def _discoverLimbs():
+
+    """Lists the limbs saved in the scene, straight from the scene"""
+
+    limb_sets = _limbSets()
+    if limb_sets:
+        data_nodes = _limbSetMembers(limb_sets)
+    else:
+        # Scenes saved before limbs were tagged
+        data_nodes = _findUntaggedLimbNodes()
+    # Nodes maya renamed on a name clash (limb_DATA1) are not limbs of their own
+    return [data.removesuffix(DATA_SUFFIX) for data in data_nodes if data.endswith(DATA_SUFFIX)]
+
+
+def _limbSets():
+
+    """Lists the limb sets of the scene, the root one and the ones referenced rigs bring in their namespace"""
+
+    return [node for node in cmds.ls('*' + LIMB_SET, recursive=True, type='objectSet') or [] if _isLimbSet(node)]
+
+
+def _isLimbSet(node):
+
+    """Tells if a set is a limb set, in any namespace"""
+
+    return node.split('|')[-1].rpartition(':')[2] == LIMB_SET
+
+
+def _limbSetMembers(limb_sets):
+
+    """Lists the limb nodes held by limb sets, once each"""
+
+    data_nodes = []
+    for limb_set in limb_sets:
+        data_nodes += [node for node in cmds.sets(limb_set, q=True) or [] if node not in data_nodes]
+    return data_nodes
+
+
+def _referencedRecord(name, record):
+
+    """Puts a record in the namespace its limb node was referenced under.
+
+    A limb registered in a rig's own file names its nodes without the namespace the rig
+    gets once referenced, string attributes are not renamed. Templates are bound per
+    instance instead.
+    """
+
+    if record.template:
+        return record
+    node_namespace = name.split('|')[-1].rpartition(':')[0]
+    record_namespace = record.blend_attr.split('.', 1)[0].split('|')[-1].rpartition(':')[0]
+    # Only the namespaces added on top of the record's own
+    inner_namespace = ':' + record_namespace if record_namespace else ''
+    if node_namespace == record_namespace or not node_namespace.endswith(inner_namespace):
+        return record
+    return record.bind(node_namespace[:len(node_namespace) - len(inner_namespace)])
+
+
+def _discoverInstances(record):
+
+    """Lists the namespaces holding the blend control of a template, straight from the scene"""
+
+    if not record.template:
+        return ['']
+    blend_node = record.blend_attr.split('.', 1)[0].split('|')[-1]
+    return [node.split('|')[-1].rpartition(':')[0] for node in cmds.ls(blend_node, recursive=True) or []]
+
+
+def _findUntaggedLimbNodes():
+
+    """Finds limb nodes by name and attributes, for scenes without the limb set"""
+
+    data_nodes = cmds.ls('*' + DATA_SUFFIX, type='network', recursive=True)
+    return [node for node in data_nodes
+            if cmds.attributeQuery(limb_record.RECORD_ATTRIBUTE, node=node, exists=True)
+            or cmds.attributeQuery(limb_record.LEGACY_ATTRIBUTES[0], node=node, exists=True)]
+
+
+def tagLimbNode(node):
+
+    """Marks a node as a limb and adds it to the limb set, creating the set when needed"""
+
+    if not cmds.objExists(LIMB_SET):
+        # Adopt the limbs created before the set existed, not the ones referenced limb sets hold
+        tagged_nodes = set(_limbSetMembers(_limbSets()))
+        untagged_nodes = [untagged_node for untagged_node in _findUntaggedLimbNodes() if untagged_node not in tagged_nodes]
+        cmds.sets(name=LIMB_SET, empty=True)
+        for untagged_node in untagged_nodes:
+            tagLimbNode(untagged_node)
+
+    if not cmds.attributeQuery(LIMB_TAG, node=node, exists=True):
+        cmds.addAttr(node, ln=LIMB_TAG, at='bool', dv=True)
+    cmds.sets(node, add=LIMB_SET)
+
+
+_registry = LimbRegistry()
+
+
+def getRegistry():
+
+    """Returns the registry shared by the whole session"""
+
+    return _registry
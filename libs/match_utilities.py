@@ -1,8 +1,29 @@
 import json
+from contextlib import contextmanager
 from pathlib import Path
-from maya import cmds
+import numpy as np
 
-from ..ui import matchData_UI
+from . import evaluation
+from . import frame_pool
+from . import key_reduction
+from . import limb_record
+from . import limb_registry
+from . import matrix_utilities
+from . import scene_io
+from . import transaction
+from .cmds_backend import cmds
+
+
+# Residuals below which a chain counts as matched, in scene units and degrees
+MATCHED_TOLERANCE = (1e-4, 1e-3)
+
+# States a limb blend can be in
+FK = 'fk'
+IK = 'ik'
+PARTIAL = 'partial'
+
+# Distance to a blend value still counting as on it, as a fraction of the blend range
+BLEND_TOLERANCE = 1e-3
 
 
 class Match():
@@ -14,7 +35,11 @@ class Match():
                  ik_controls: tuple,
                  ik_joints: tuple,
                  fk_controls: tuple,
-                 fk_joints: tuple,):
+                 fk_joints: tuple,
+                 ik_offsets: tuple = None,
+                 fk_offsets: tuple = None,
+                 pole_index: int = None,
+                 pole_distance: float = None,):
 
         # Declare variables
         self.blend_attribute = blend_attribute
@@ -25,55 +50,747 @@ class Match():
         self.fk_controls = fk_controls
         self.fk_joints = fk_joints
 
+        # Control to joint rest offsets, controls sit right on their joints without them
+        self.ik_offsets = _offsetMatrices(ik_offsets, len(ik_controls))
+        self.fk_offsets = _offsetMatrices(fk_offsets, len(fk_controls))
+
+        # Index of the ik control placed analytically as a pole vector, None to snap it like the others
+        self.pole_index = pole_index
+        self.pole_distance = pole_distance
+
+
+    @classmethod
+    def fromRecord(cls, record):
+
+        """Creates a matcher from a limb record"""
+
+        return cls(record.blend_attr, record.fk_blend_value, record.ik_blend_value,
+                   record.ik_controls, record.ik_joints, record.fk_controls, record.fk_joints,
+                   record.ik_offsets, record.fk_offsets, record.pole_index, record.pole_distance)
+
+
+    def IKtoFK(self, tolerance=None, flip_matched=True):
+
+        """Turns the IK limb into an FK, returns how far off it was as (translate, rotate) residuals, see _applyMatches"""
+
+        with _undoChunk('matchIkFk'), evaluation.suspendedEvaluation():
+            return _applyMatches([self._ikToFk()], tolerance, flip_matched)[0]
+
+
+    def FKtoIK(self, tolerance=None, flip_matched=True):
+
+        """Turns the FK limb into an IK, returns how far off it was as (translate, rotate) residuals, see _applyMatches"""
+
+        with _undoChunk('matchIkFk'), evaluation.suspendedEvaluation():
+            return _applyMatches([self._fkToIk()], tolerance, flip_matched)[0]
+
+
+    def bakeIKtoFK(self, start=None, end=None, tangent='global', key_tolerance=None, sample_tolerance=None,
+                   on_keys=False, processes=None):
+
+        """Turns the IK limb into an FK over a frame range (the timeline by default), keying the fk controls, returns the bake report"""
+
+        with _undoChunk('matchIkFk'), evaluation.suspendedEvaluation():
+            return _bakeMatches([self._ikToFk()], start, end, tangent, key_tolerance, sample_tolerance, on_keys,
+                                processes)
+
+
+    def bakeFKtoIK(self, start=None, end=None, tangent='global', key_tolerance=None, sample_tolerance=None,
+                   on_keys=False, processes=None):
+
+        """Turns the FK limb into an IK over a frame range (the timeline by default), keying the ik controls, returns the bake report"""
+
+        with _undoChunk('matchIkFk'), evaluation.suspendedEvaluation():
+            return _bakeMatches([self._fkToIk()], start, end, tangent, key_tolerance, sample_tolerance, on_keys,
+                                processes)
+
+
+    def _ikToFk(self, partial=False):
+
+        """Snaps the fk controls onto the ik joints, or onto the blended pose when partial, ending on the fk blend value"""
+
+        return _ChainMatch(self.ik_joints, self.fk_controls, self.fk_offsets, None, None,
+                           self.blend_attribute, self.fk_blend_value, self.ik_controls,
+                           self.fk_joints if partial else (), self.ik_blend_value)
+
+
+    def _fkToIk(self, partial=False):
+
+        """Snaps the ik controls onto the fk joints, or onto the blended pose when partial, ending on the ik blend value"""
+
+        return _ChainMatch(self.fk_joints, self.ik_controls, self.ik_offsets, self.pole_index, self.pole_distance,
+                           self.blend_attribute, self.ik_blend_value, self.fk_controls,
+                           self.ik_joints if partial else (), self.fk_blend_value)
+
+
+    def _switchMatch(self, state, value=None):
+
+        """Returns the match switching away from the side of a blend state.
+
+        Limbs caught mid-blend go to their closest side, which takes over the pose the blend
+        shows. They are left alone (None) when no value is given or their chains can't be
+        blended joint to joint.
+        """
+
+        if state == FK:
+            return self._fkToIk()
+        if state == IK:
+            return self._ikToFk()
+        if value is None or len(self.ik_joints) != len(self.fk_joints):
+            return None
+        if abs(value - self.ik_blend_value) <= abs(value - self.fk_blend_value):
+            return self._fkToIk(partial=True)
+        return self._ikToFk(partial=True)
+
+
+class _ChainMatch():
+
+    """One way of switching a limb: the controls snapped onto the joints, and the blend value it ends on"""
+
+    def __init__(self, joints, controls, offsets, pole_index, pole_distance, blend_attribute, blend_value,
+                 source_controls=(), blend_joints=(), source_blend_value=None):
+        self.joints = joints
+        self.controls = controls
+        self.offsets = offsets
+        self.pole_index = pole_index
+        self.pole_distance = pole_distance
+        self.blend_attribute = blend_attribute
+        self.blend_value = blend_value
+
+        # Controls of the side switched away from, animated by the animator
+        self.source_controls = source_controls
+
+        # Joints of the side switched to, blended with joints when caught mid-blend, and the blend value of the other side
+        self.blend_joints = blend_joints
+        self.source_blend_value = source_blend_value
+
+
+def matchLimbs(names=None, bake=False, start=None, end=None, tangent='global', key_tolerance=None,
+               sample_tolerance=None, on_keys=False, processes=None, tolerance=None, flip_matched=True,
+               blend_tolerance=None, partial=True, report=None):
+
+    """Switches several limbs at once (every saved limb by default) as a single undo step.
+
+    Each limb goes to the other side of its blend, blend_tolerance deciding what counts as
+    on a side (see blendStates). Limbs caught mid-blend go to their closest side, matching
+    the pose the blend shows, unless partial is off which leaves them alone.
+    Template limbs match every instance of the rig, 'namespace:limb' names pick one of them.
+    The chains of all limbs are read in one pass, stacked and solved together, then written
+    in one batch, so controls parented under controls of another limb follow it. Limbs
+    already matched within tolerance are not written, see _applyMatches. The report dict,
+    when one is given, gets the seconds the batch took with and without the viewport
+    suspended (see evaluation.timings), and bakes add the bake report of _bakeMatches.
+    Returns the matched limbs.
+    """
+
+    matched_names, chain_matches = _plannedMatches(names, blend_tolerance, partial)
+
+    if chain_matches:
+        timings = evaluation.timings()
+        with _undoChunk('matchIkFk'), evaluation.suspendedEvaluation():
+            if bake:
+                bake_report = _bakeMatches(chain_matches, start, end, tangent, key_tolerance, sample_tolerance,
+                                           on_keys, processes)
+                matched_names = [name for name, chain_match in zip(matched_names, chain_matches)
+                                 if chain_match.blend_attribute not in bake_report['unkeyed']]
+                if report is not None:
+                    report.update(bake_report)
+            else:
+                _applyMatches(chain_matches, tolerance, flip_matched)
+        if report is not None:
+            report.update((key, evaluation.timings()[key] - timings[key])
+                          for key in ('suspended_seconds', 'unsuspended_seconds'))
+    return matched_names
+
+
+def matchResiduals(names=None, blend_tolerance=None, partial=True):
+
+    """Tells how far each limb (every saved limb by default) is from being matched, without writing anything.
+
+    Returns {limb: (translate, rotate)} residuals of the switch each limb would go through,
+    the largest distance and angle in degrees between a control and its target. Limbs
+    caught mid-blend are measured against the pose their blend shows, unless partial is off
+    which leaves them out.
+    """
+
+    matched_names, chain_matches = _plannedMatches(names, blend_tolerance, partial)
+    if not chain_matches:
+        return {}
+
+    scene = scene_io.getSceneIO()
+    joints = [joint for chain_match in chain_matches for joint in chain_match.joints]
+    controls = [ctrl for chain_match in chain_matches for ctrl in chain_match.controls]
+    control_matrices = scene.readMatrices(controls, 'worldMatrix')
+    target_matrices = _targetMatrices(chain_matches, _readJointMatrices(chain_matches, joints), control_matrices)
+    return dict(zip(matched_names, _chainResiduals(chain_matches, control_matrices, target_matrices)))
+
+
+def blendStates(names=None, tolerance=None):
+
+    """Snapshots the blend of every limb (every saved limb by default), reading them all in one pass.
+
+    Returns {limb: (state, value)}, state being FK or IK when the blend sits within
+    tolerance (a fraction of the blend range, BLEND_TOLERANCE by default) of that side's
+    value, PARTIAL otherwise. Template limbs give one entry per instance.
+    """
+
+    return {name: (state, value) for name, record, state, value in _blendSnapshot(names, tolerance)}
+
+
+def _blendSnapshot(names=None, tolerance=None):
+
+    """Lists (name, record, state, blend value) for limbs, see blendStates"""
+
+    if names is None:
+        names = limb_registry.getRegistry().names()
+    bound_records = _boundRecords(names)
+    if not bound_records:
+        return []
+
+    records = [record for name, record in bound_records]
+    values = np.array(scene_io.getSceneIO().readAttributes([record.blend_attr for record in records]), dtype=np.float64)
+    fk_values = np.array([record.fk_blend_value for record in records], dtype=np.float64)
+    ik_values = np.array([record.ik_blend_value for record in records], dtype=np.float64)
+
+    # Classify every limb at once, the closest side wins when the range is tiny
+    tolerances = (BLEND_TOLERANCE if tolerance is None else tolerance) * np.abs(ik_values - fk_values)
+    fk_distances = np.abs(values - fk_values)
+    ik_distances = np.abs(values - ik_values)
+    states = np.where((fk_distances <= tolerances) & (fk_distances <= ik_distances), FK,
+                      np.where(ik_distances <= tolerances, IK, PARTIAL))
+    return [(name, record, str(state), float(value))
+            for (name, record), state, value in zip(bound_records, states, values)]
+
+
+def _plannedMatches(names, blend_tolerance=None, partial=True):
+
+    """Figures out which way each limb should go, returns the limbs to switch and their chain matches"""
+
+    matched_names = []
+    chain_matches = []
+    for name, record, state, value in _blendSnapshot(names, blend_tolerance):
+        chain_match = Match.fromRecord(record)._switchMatch(state, value if partial else None)
+        if chain_match is not None:
+            matched_names.append(name)
+            chain_matches.append(chain_match)
+    return matched_names, chain_matches
+
+
+def _boundRecords(names):
+
+    """Resolves limb names into (name, record) pairs, templates giving one pair per instance"""
+
+    registry = limb_registry.getRegistry()
+    saved_names = set(registry.names())
+    bound_records = []
+    for name in names:
+        if name not in saved_names:
+            # A single instance of a template
+            namespace, _, template_name = name.rpartition(':')
+            bound_records.append((name, registry.record(template_name).bind(namespace)))
+            continue
+
+        record = registry.record(name)
+        if not record.template:
+            bound_records.append((name, record))
+            continue
+        for namespace in registry.instances(name):
+            bound_records.append((limb_record.addNamespace(name, namespace), record.bind(namespace)))
+    return bound_records
+
+
+def _applyMatches(chain_matches, tolerance=None, flip_matched=True):
+
+    """Snaps the controls of every chain onto their joints with matrix math, then switches the blends.
+
+    Chains whose controls all sit within tolerance (one value, or translate and rotate values
+    in scene units and degrees, MATCHED_TOLERANCE by default) of their targets are not
+    written, only their blend is switched unless flip_matched is off. Returns the
+    (translate, rotate) residual of each chain before matching.
+    """
+
+    scene = scene_io.getSceneIO()
+    joints = [joint for chain_match in chain_matches for joint in chain_match.joints]
+    controls = [ctrl for chain_match in chain_matches for ctrl in chain_match.controls]
+
+    # Read the current state of every chain in one pass
+    joint_matrices = _readJointMatrices(chain_matches, joints)
+    control_matrices = scene.readMatrices(controls, 'worldMatrix')
+    parent_matrices = scene.readMatrices(controls, 'parentMatrix')
+    rotate_orders = scene.readRotateOrders(controls)
+    rotate_axes, joint_orients = scene.readRotateSpaces(controls)
+    pivots = scene.readPivots(controls)
+
+    target_matrices = _targetMatrices(chain_matches, joint_matrices, control_matrices)
+    ancestors = _chainAncestors(controls)
+    translates, rotates = _solveChain(target_matrices, control_matrices, parent_matrices,
+                                      rotate_orders, ancestors, rotate_axes, joint_orients, pivots)
+
+    # Leave alone the chains already matched, unless a control they hang under moves
+    residuals = _chainResiduals(chain_matches, control_matrices, target_matrices)
+    translate_tolerance, rotate_tolerance = _tolerances(MATCHED_TOLERANCE if tolerance is None else tolerance)
+    moving_chains = [translate > translate_tolerance or rotate > rotate_tolerance for translate, rotate in residuals]
+    moving = np.repeat(moving_chains, [len(chain_match.controls) for chain_match in chain_matches])
+    for i, ancestor in ancestors:
+        moving[i] |= moving[ancestor]
+    written = np.flatnonzero(moving)
+    switched = [chain_match for chain_match, chain_moving in zip(chain_matches, moving_chains)
+                if chain_moving or flip_matched]
+
+    # Write the channels and switch the attributes as one transaction
+    match_transaction = transaction.Transaction()
+    if len(written):
+        match_transaction.recordTransforms(scene, [controls[i] for i in written], translates[written], rotates[written])
+    if switched:
+        match_transaction.recordAttributes(scene, [chain_match.blend_attribute for chain_match in switched],
+                                           [chain_match.blend_value for chain_match in switched])
+    transaction.commit(match_transaction)
+    return residuals
+
+
+def _chainResiduals(chain_matches, control_matrices, target_matrices):
+
+    """Returns the (translate, rotate) residual of each chain, from its control furthest from its target"""
+
+    translate_residuals, rotate_residuals = matrix_utilities.matrixResiduals(control_matrices, target_matrices)
+    starts = np.cumsum([0] + [len(chain_match.controls) for chain_match in chain_matches[:-1]])
+    return list(zip(np.maximum.reduceat(translate_residuals, starts).tolist(),
+                    np.maximum.reduceat(rotate_residuals, starts).tolist()))
+
+
+def _readJointMatrices(chain_matches, joints):
+
+    """Reads the (n, 4, 4) world matrices of the joints of every chain, blended for chains caught mid-blend"""
+
+    scene = scene_io.getSceneIO()
+    joint_matrices = scene.readMatrices(joints, 'worldMatrix')
+    partial_matches, partial_indices = _partialChains(chain_matches)
+    if partial_matches:
+        blend_joints = [joint for chain_match in partial_matches for joint in chain_match.blend_joints]
+        blend_attributes = [chain_match.blend_attribute for chain_match in partial_matches]
+        joint_matrices[partial_indices] = _blendedPoses(partial_matches, joint_matrices[partial_indices],
+                                                        scene.readMatrices(blend_joints, 'worldMatrix'),
+                                                        scene.readAttributes(blend_attributes))
+    return joint_matrices
+
+
+def _partialChains(chain_matches):
+
+    """Lists the chains caught mid-blend, and the indices of their joints among the joints of all chains"""
+
+    partial_matches = []
+    partial_indices = []
+    first = 0
+    for chain_match in chain_matches:
+        if chain_match.blend_joints:
+            partial_matches.append(chain_match)
+            partial_indices.extend(range(first, first + len(chain_match.joints)))
+        first += len(chain_match.joints)
+    return partial_matches, np.array(partial_indices, dtype=int)
+
+
+def _blendedPoses(chain_matches, joint_matrices, blend_joint_matrices, blend_values):
+
+    """Blends the (..., n, 4, 4) joints of mid-blend chains with their blend joints the way the rig shows them.
+
+    blend_values are the (..., chains) values of the blend attributes, joints are slerped
+    and lerped towards the blend joints as the value goes from the source blend value to
+    the one the chain ends on.
+    """
+
+    source_values = np.array([chain_match.source_blend_value for chain_match in chain_matches], dtype=np.float64)
+    target_values = np.array([chain_match.blend_value for chain_match in chain_matches], dtype=np.float64)
+    weights = np.clip((np.asarray(blend_values, dtype=np.float64) - source_values) / (target_values - source_values),
+                      0.0, 1.0)
+    weights = np.repeat(weights, [len(chain_match.joints) for chain_match in chain_matches], axis=-1)
+    return matrix_utilities.blendMatrices(joint_matrices, blend_joint_matrices, weights)
+
+
+def _bakeMatches(chain_matches, start=None, end=None, tangent='global', key_tolerance=None, sample_tolerance=None,
+                 on_keys=False, processes=None):
+
+    """Samples the whole range for every chain first, solves every frame at once, then writes all the keys.
+
+    key_tolerance (one value, or translate and rotate values in scene units and degrees)
+    drops the keys linear interpolation rebuilds within it. sample_tolerance (same form)
+    evaluates sparse frames only, see _sampleAdaptively. Both bound the error of linear
+    interpolation, so they key linear tangents ('global' turns into 'linear', any other
+    type is refused). on_keys only matches the times the
+    source controls of each chain are keyed on. Long bakes are solved over a pool of
+    processes (all cores by default, 1 keeps everything in this process). Returns a report
+    of the frames evaluated, the keys baked and kept, the largest translate and rotate
+    errors the reduction introduced, and the blend attributes of the chains left alone for
+    having no keys to match on.
+    """
+
+    if on_keys and sample_tolerance is not None:
+        raise ValueError("Matching on existing keys and adaptive sampling can't be combined")
+    if key_tolerance is not None or sample_tolerance is not None:
+        # The tolerances hold between keys only as long as they are interpolated linearly
+        if tangent == 'global':
+            tangent = 'linear'
+        elif tangent != 'linear':
+            raise ValueError("Key reduction and adaptive sampling bound linear interpolation, "
+                             "they can't key %s tangents" % tangent)
+
+    start, end = _frameRange(start, end)
+    solver = _FrameSolver(chain_matches, processes)
+
+    keep = None
+    keyed_matches = chain_matches
+    unkeyed = []
+    if on_keys:
+        frames, keep = _sourceKeyTimes(chain_matches, start, end)
+        translates, rotates = solver.solve(frames)
+
+        # Chains with nothing keyed in the range get no keys, their blend must not switch either
+        keyed_matches = [chain_match for chain_match, chain_keep
+                         in zip(chain_matches, np.split(keep, np.cumsum([len(chain_match.controls)
+                                                                         for chain_match in chain_matches])[:-1], axis=1))
+                         if chain_keep.any()]
+        unkeyed += [chain_match.blend_attribute for chain_match in chain_matches if chain_match not in keyed_matches]
+        if unkeyed:
+            cmds.warning("Nothing keyed between frames %g and %g to match on, left alone: %s"
+                         % (start, end, ', '.join(unkeyed)))
+    elif sample_tolerance is None:
+        frames = list(range(int(start), int(end) + 1))
+        translates, rotates = solver.solve(frames)
+    else:
+        frames, translates, rotates = _sampleAdaptively(solver, int(start), int(end), sample_tolerance)
+
+    # Keep the rotations continuous from frame to frame before keying them
+    rotates = matrix_utilities.filterEuler(rotates, solver.rotate_orders)
+
+    # Drop the keys the remaining ones already rebuild
+    keys = translates.size + rotates.size if keep is None else int(keep.sum())
+    report = {'evaluated_frames': solver.evaluated_frames, 'keys': keys, 'kept_keys': keys,
+              'translate_error': 0.0, 'rotate_error': 0.0, 'unkeyed': unkeyed}
+    if key_tolerance is not None:
+        keep, translate_error, rotate_error = _reduceKeys(frames, translates, rotates, key_tolerance, keep)
+        report.update(kept_keys=int(keep.sum()), translate_error=translate_error, rotate_error=rotate_error)
+
+    # Write the keys, a whole curve at a time where the scene io allows it, as one undo step
+    bake_transaction = transaction.Transaction()
+    bake_transaction.recordKeys(solver.scene, solver.controls, frames, translates, rotates, tangent, keep, (start, end))
+    transaction.commit(bake_transaction)
+
+    # Key the attributes at both ends of the range
+    for chain_match in keyed_matches:
+        _keyBlend(chain_match.blend_attribute, chain_match.blend_value, start, end)
+    return report
+
+
+def _sourceKeyTimes(chain_matches, start, end):
+
+    """Gathers the times the source controls of each chain are keyed on within a range.
+
+    Returns the sorted union of every chain's times, to solve them all in one batch, and a
+    (times, n, 6) mask keying each chain's controls on its own times only.
+    """
+
+    scene = scene_io.getSceneIO()
+    chain_times = [[time for time in scene.readKeyTimes(chain_match.source_controls) if start <= time <= end]
+                   for chain_match in chain_matches]
+    times = sorted(set().union(*chain_times))
+    rows = {time: i for i, time in enumerate(times)}
+
+    keep = np.zeros((len(times), sum(len(chain_match.controls) for chain_match in chain_matches), 6), dtype=bool)
+    first = 0
+    for chain_match, time_list in zip(chain_matches, chain_times):
+        keep[[rows[time] for time in time_list], first:first + len(chain_match.controls)] = True
+        first += len(chain_match.controls)
+    return times, keep
+
+
+def _reduceKeys(frames, translates, rotates, key_tolerance, keep=None):
+
+    """Drops the baked keys rebuilt within tolerance, among the ones allowed by a (frames, n, 6) mask.
+
+    Returns the mask of the keys to write and the largest translate and rotate errors introduced.
+    """
+
+    translate_tolerance, rotate_tolerance = _tolerances(key_tolerance)
+    frames = np.asarray(frames, dtype=np.float64)
+    if keep is None:
+        keep = np.ones(translates.shape[:2] + (6,), dtype=bool)
+
+    # Controls keyed on the same frames are reduced together, on those frames only
+    groups = {}
+    for i in range(keep.shape[1]):
+        groups.setdefault(keep[:, i, 0].tobytes(), []).append(i)
+
+    reduced = np.zeros_like(keep)
+    translate_error = rotate_error = 0.0
+    for columns in groups.values():
+        rows = np.flatnonzero(keep[:, columns[0], 0])
+        translate_keep, translate_errors = key_reduction.reduceKeys(frames[rows], translates[np.ix_(rows, columns)],
+                                                                    translate_tolerance)
+        rotate_keep, rotate_errors = key_reduction.reduceKeys(frames[rows], rotates[np.ix_(rows, columns)],
+                                                              rotate_tolerance)
+        reduced[np.ix_(rows, columns)] = np.concatenate((translate_keep, rotate_keep), axis=-1)
+        translate_error = max(translate_error, float(translate_errors.max(initial=0.0)))
+        rotate_error = max(rotate_error, float(rotate_errors.max(initial=0.0)))
+    return reduced, translate_error, rotate_error
+
+
+# Control solves (frames times controls) worth a process of their own
+_POOL_CHUNK_SOLVES = 500000
+
+
+class _FrameSolver():
+
+    """Solves the controls of a set of chains at any list of frames, reading what does not animate once"""
+
+    def __init__(self, chain_matches, processes=None):
+        self.scene = scene_io.getSceneIO()
+        self.chain_matches = chain_matches
+        self.processes = processes
+        self.joints = [joint for chain_match in chain_matches for joint in chain_match.joints]
+        self.controls = [ctrl for chain_match in chain_matches for ctrl in chain_match.controls]
+        self.rotate_orders = self.scene.readRotateOrders(self.controls)
+        self.rotate_axes, self.joint_orients = self.scene.readRotateSpaces(self.controls)
+        self.pivots = self.scene.readPivots(self.controls)
+        self.ancestors = _chainAncestors(self.controls)
+        self.partial_matches, self.partial_indices = _partialChains(chain_matches)
+        self.evaluated_frames = 0
 
-    def IKtoFK(self):
 
-        """Turns the IK limb into an FK"""
+    def solve(self, frames):
 
-        # Create the temp pc list
-        parent_constraints = []
-        # Iterate over controls to match them
-        for i, ctrl in enumerate(self.ik_joints):
-            temp_pc = cmds.parentConstraint(ctrl, self.fk_controls[i])[0]
-            parent_constraints.append(temp_pc)
+        """Returns (frames, n, 3) translate and rotate values matching the controls at each frame"""
 
-        # delete the temp parent constraints
-        for pc in parent_constraints:
-            cmds.delete(pc)
+        if not len(frames):
+            return np.zeros((0, len(self.controls), 3)), np.zeros((0, len(self.controls), 3))
 
-        # Switch the attribute
-        cmds.setAttr(self.blend_attribute, self.fk_blend_value)
+        # Sample every frame before touching anything, without moving the current time
+        joint_matrices = self.scene.sampleMatrices(self.joints, 'worldMatrix', frames)
+        control_matrices = self.scene.sampleMatrices(self.controls, 'worldMatrix', frames)
+        parent_matrices = self.scene.sampleMatrices(self.controls, 'parentMatrix', frames)
+        if self.partial_matches:
+            # The blend may move over the range, follow it frame by frame
+            blend_joints = [joint for chain_match in self.partial_matches for joint in chain_match.blend_joints]
+            blend_attributes = [chain_match.blend_attribute for chain_match in self.partial_matches]
+            joint_matrices[:, self.partial_indices] = _blendedPoses(
+                self.partial_matches, joint_matrices[:, self.partial_indices],
+                self.scene.sampleMatrices(blend_joints, 'worldMatrix', frames),
+                self.scene.sampleAttributes(blend_attributes, frames))
+        self.evaluated_frames += len(frames)
+
+        # Solve the (frames, controls) stack, split over processes when there is enough of it
+        shape = (len(frames), len(self.controls), 3)
+        min_chunk = -(-_POOL_CHUNK_SOLVES // max(len(self.controls), 1))
+        return frame_pool.mapFrames(_solveFrames, (self.chain_matches, self.rotate_orders, self.ancestors,
+                                                   self.rotate_axes, self.joint_orients, self.pivots),
+                                    (joint_matrices, control_matrices, parent_matrices), (shape, shape),
+                                    self.processes, min_chunk)
 
 
-    def FKtoIK(self):
+def _solveFrames(chain_matches, rotate_orders, ancestors, rotate_axes, joint_orients, pivots,
+                 joint_matrices, control_matrices, parent_matrices):
+
+    """Solves sampled (frames, n, 4, 4) matrices into translate and rotate values, in or out of this process"""
+
+    target_matrices = _targetMatrices(chain_matches, joint_matrices, control_matrices)
+    return _solveChain(target_matrices, control_matrices, parent_matrices, rotate_orders,
+                       ancestors, rotate_axes, joint_orients, pivots)
 
-        """Turns the FK limb into an IK"""
 
-        # Create the temp pc list
-        parent_constraints = []
-        # Iterate over controls to match them
-        for i, ctrl in enumerate(self.fk_joints):
-            temp_pc = cmds.parentConstraint(ctrl, self.ik_controls[i])[0]
-            parent_constraints.append(temp_pc)
+def _sampleAdaptively(solver, start, end, tolerance, step=8):
+
+    """Solves sparse frames, refining only where interpolating them strays from the real match.
+
+    Starts every step frames, then evaluates the middle of each segment and compares it to
+    the linear interpolation of its ends. Segments out of tolerance keep their middle frame
+    and get split, the others are done. Returns the sampled frames and their values, which
+    rebuild every checked frame within tolerance through linear interpolation.
+    """
+
+    translate_tolerance, rotate_tolerance = _tolerances(tolerance)
+    frames = sorted(set(range(start, end, step)) | {end})
+    translates, rotates = solver.solve(frames)
+    rotates = matrix_utilities.filterEuler(rotates, solver.rotate_orders)
+    samples = {frame: (translates[i], rotates[i]) for i, frame in enumerate(frames)}
+
+    segments = [(first, last) for first, last in zip(frames[:-1], frames[1:]) if last - first > 1]
+    while segments:
+        middles = [(first + last) // 2 for first, last in segments]
+        middle_translates, middle_rotates = solver.solve(middles)
+
+        # What linear interpolation of the segment ends gives at the middles
+        weights = np.array([(middle - first) / (last - first) for middle, (first, last) in zip(middles, segments)])[:, None, None]
+        first_translates, first_rotates = (np.stack(values) for values in zip(*[samples[first] for first, last in segments]))
+        last_translates, last_rotates = (np.stack(values) for values in zip(*[samples[last] for first, last in segments]))
+        expected_translates = first_translates + (last_translates - first_translates) * weights
+        expected_rotates = first_rotates + (last_rotates - first_rotates) * weights
 
-        # delete the temp parent constraints
-        for pc in parent_constraints:
-            cmds.delete(pc)
+        # Bring the real rotations next to the expected ones before comparing
+        middle_rotates = matrix_utilities.filterEuler(np.stack((expected_rotates, middle_rotates)), solver.rotate_orders)[1]
+        translate_errors = np.abs(middle_translates - expected_translates).max(axis=(1, 2), initial=0.0)
+        rotate_errors = np.abs(middle_rotates - expected_rotates).max(axis=(1, 2), initial=0.0)
 
-        # Switch the attribute
-        cmds.setAttr(self.blend_attribute, self.ik_blend_value)
+        refined_segments = []
+        for i, (first, last) in enumerate(segments):
+            if translate_errors[i] <= translate_tolerance and rotate_errors[i] <= rotate_tolerance:
+                continue
+            middle = middles[i]
+            samples[middle] = (middle_translates[i], middle_rotates[i])
+            refined_segments += [(first, middle), (middle, last)]
+        segments = [(first, last) for first, last in refined_segments if last - first > 1]
+
+    frames = sorted(samples)
+    return (frames, np.stack([samples[frame][0] for frame in frames]),
+            np.stack([samples[frame][1] for frame in frames]))
+
+
+def _tolerances(tolerance):
+
+    """Splits a tolerance into translate and rotate values, a single value serving both"""
+
+    if isinstance(tolerance, (tuple, list)):
+        return tuple(tolerance)
+    return tolerance, tolerance
+
+
+def _targetMatrices(chain_matches, joint_matrices, control_matrices):
+
+    """Computes where each control of the chains should land in world space, for (..., n, 4, 4) inputs"""
+
+    # Controls land on their joints, keeping the offset they had at registration
+    offsets = np.concatenate([chain_match.offsets for chain_match in chain_matches])
+    target_matrices = offsets @ joint_matrices
+
+    # Root, middle and end joint of the chains with a pole vector, the pole control sits at the middle
+    poles = []
+    first = 0
+    for chain_match in chain_matches:
+        if chain_match.pole_index is not None:
+            distance = np.nan if chain_match.pole_distance is None else chain_match.pole_distance
+            poles.append((first, first + chain_match.pole_index, first + len(chain_match.joints) - 1, distance))
+        first += len(chain_match.joints)
+
+    # Pole vectors only move, out from the middle joint on the chain plane
+    if poles:
+        roots, mids, ends, distances = (np.array(column) for column in zip(*poles))
+        positions = joint_matrices[..., 3, :3]
+        target_matrices[..., mids, :, :] = control_matrices[..., mids, :, :]
+        target_matrices[..., mids, 3, :3] = matrix_utilities.poleVectorPositions(
+            positions[..., roots, :], positions[..., mids, :], positions[..., ends, :],
+            distances[:, None], control_matrices[..., mids, 3, :3])
+    return target_matrices
+
+
+def _solveChain(target_matrices, control_matrices, parent_matrices, rotate_orders, ancestors,
+                rotate_axes=None, joint_orients=None, pivots=None):
+
+    """Computes the local translate/rotate values bringing controls onto world targets, for (..., n, 4, 4) inputs"""
+
+    parent_matrices = parent_matrices.copy()
+
+    # Controls parented under other controls of the chain follow their moved ancestor
+    for i, ancestor in ancestors:
+        relative_matrices = parent_matrices[..., i, :, :] @ matrix_utilities.inverseMatrices(control_matrices[..., ancestor, :, :])
+        parent_matrices[..., i, :, :] = relative_matrices @ target_matrices[..., ancestor, :, :]
+
+    # Turn the world targets into local channel values
+    local_matrices = matrix_utilities.localMatrices(target_matrices, parent_matrices)
+    # Rotate axes, joint orients and pivots are mostly zeros, skip them when they are
+    if rotate_axes is not None and not np.any(rotate_axes):
+        rotate_axes = None
+    if joint_orients is not None and not np.any(joint_orients):
+        joint_orients = None
+    if pivots is not None and not np.any(pivots):
+        pivots = None
+    translates, rotates, scales = matrix_utilities.decomposeMatrices(local_matrices, rotate_orders,
+                                                                     rotate_axes, joint_orients, pivots)
+    return translates, rotates
+
+
+def _offsetMatrices(offsets, count):
+
+    """Turns stored offsets into a (n, 4, 4) array, identities when there are none"""
+
+    if offsets is None:
+        return np.tile(np.identity(4), (count, 1, 1))
+    return matrix_utilities.asMatrices(offsets)
+
+
+def _restOffsets(joints, controls):
+
+    """Measures the offset of each control relative to the joint it drives, as flat 16 float tuples"""
+
+    scene = scene_io.getSceneIO()
+    offsets = scene.readMatrices(controls, 'worldMatrix') @ matrix_utilities.inverseMatrices(scene.readMatrices(joints, 'worldMatrix'))
+    return tuple(tuple(float(value) for value in offset.flatten()) for offset in offsets)
+
+
+def _chainAncestors(nodes):
+
+    """Lists (index, ancestor index) pairs for nodes parented below another node of the list, parents first"""
+
+    long_names = scene_io.getSceneIO().readLongNames(nodes)
+    indices = {name: i for i, name in enumerate(long_names)}
+    ancestors = []
+
+    # Visit shallow nodes first so ancestors are always resolved before their children
+    for i in sorted(range(len(nodes)), key=lambda index: long_names[index].count('|')):
+        # Walk up the path, the first node of the list found is the deepest ancestor driving this one
+        path = long_names[i]
+        while '|' in path:
+            path = path.rsplit('|', 1)[0]
+            if path in indices:
+                ancestors.append((i, indices[path]))
+                break
+    return ancestors
+
+
+def _frameRange(start, end):
+
+    """Fills in a missing range boundary with the timeline one"""
+
+    if start is None:
+        start = cmds.playbackOptions(q=True, minTime=True)
+    if end is None:
+        end = cmds.playbackOptions(q=True, maxTime=True)
+    return start, end
+
+
+def _keyBlend(blend_attribute, value, start, end):
+
+    """Holds the blend attribute on a value over a frame range"""
+
+    node, attribute = blend_attribute.split('.', 1)
+    # Keys left inside the range would still move the blend
+    cmds.cutKey(node, attribute=attribute, time=(start, end), clear=True)
+    for frame in (start, end):
+        cmds.setKeyframe(node, attribute=attribute, time=frame, value=value)
 
 
 class MatchData():
 
-    """Ingests some data and spits out a database node (based on maya network node)."""
+    """Ingests some data and spits out a database node (based on maya network node).
+
+    pole_index picks the ik control placed as a pole vector, 'auto' gives two-bone limbs
+    their middle control and longer chains (spines, tails...) none, None turns it off.
+    pole_distance keeps the pole that far from the middle joint, the chain length (upper plus lower bone) by default.
+    """
 
     def __init__(self,
-                 data):
+                 data,
+                 template=False,
+                 pole_index='auto',
+                 pole_distance=None):
         self.data = data
 
-        # Create database dict
-        self.createDatabaseNode()
+        # Templates are stored without namespaces and serve every instance of the rig
+        self.template = template
+
+        # Ik control placed as a pole vector and how far it sits from the chain
+        self.pole_index = pole_index
+        self.pole_distance = pole_distance
+
+        # Create database dict, without redrawing for every attribute written
+        with evaluation.suspendedEvaluation():
+            self.createDatabaseNode()
 
 
     def createDatabaseNode(self):
@@ -82,77 +799,149 @@ class MatchData():
         fk_blend_value = cmds.addAttr(blend_attr, q=1,min=1)
         ik_blend_value = cmds.addAttr(blend_attr, q=1, max=1)
 
-        # Create the dictionary
-        self.data_dict = {"blend_attr": blend_attr,
-                          "fk_blend_value": fk_blend_value,
-                          "ik_blend_value": ik_blend_value,
-                          "ik_control_01": self.data[5],
-                          "ik_control_02": self.data[6], 
-                          "ik_control_03": self.data[7], 
-                          "ik_joint_01": self.data[2],
-                          "ik_joint_02": self.data[3], 
-                          "ik_joint_03": self.data[4], 
-                          "fk_control_01": self.data[11],
-                          "fk_control_02": self.data[12], 
-                          "fk_control_03": self.data[13], 
-                          "fk_joint_01": self.data[8],
-                          "fk_joint_02": self.data[9], 
-                          "fk_joint_03": self.data[10]}
-
-        # Create the node
-        self.data_node = cmds.createNode('network', n=self.data[0]+'_DATA')
-
-        # Add the attributes to the node
-        for i in self.data_dict:
-            data_attr = cmds.addAttr(self.data_node, sn=i, dt='string')
-            cmds.setAttr("%s.%s"%(self.data_node, i), str(self.data_dict[i]), type='string')
-
-
-def _databaseProcess(raw_data_list):
+        # Gather the chains, each group of fields can hold any number of names
+        ik_joints = _splitNames(self.data[2:5])
+        ik_controls = _splitNames(self.data[5:8])
+        fk_joints = _splitNames(self.data[8:11])
+        fk_controls = _splitNames(self.data[11:14])
+
+        # Only two-bone limbs have a pole vector, unless told otherwise
+        pole_index = self.pole_index
+        if pole_index == 'auto':
+            two_bone = all(len(chain) == 3 for chain in (ik_joints, ik_controls, fk_joints, fk_controls))
+            pole_index = 1 if two_bone else None
+        elif pole_index is not None and not 0 < pole_index < len(ik_controls) - 1:
+            cmds.error("pole_index %d is not one of the middle ik controls of a %d control chain"
+                       % (pole_index, len(ik_controls)))
+
+        # Create the record
+        self.limb_record = limb_record.LimbRecord(blend_attr=blend_attr,
+                                                  fk_blend_value=float(fk_blend_value),
+                                                  ik_blend_value=float(ik_blend_value),
+                                                  ik_controls=ik_controls,
+                                                  ik_joints=ik_joints,
+                                                  fk_controls=fk_controls,
+                                                  fk_joints=fk_joints,
+                                                  ik_offsets=_restOffsets(ik_joints, ik_controls),
+                                                  fk_offsets=_restOffsets(fk_joints, fk_controls),
+                                                  pole_index=pole_index,
+                                                  pole_distance=self.pole_distance)
+        limb_name = self.data[0]
+        if self.template:
+            self.limb_record = self.limb_record.asTemplate()
+            limb_name = limb_record.stripNamespace(limb_name)
+
+        # Create the node, or take over the one of a limb registered again, and pack the record into it
+        self.data_node = limb_name + limb_registry.DATA_SUFFIX
+        if not cmds.objExists(self.data_node):
+            self.data_node = cmds.createNode('network', n=self.data_node)
+        limb_record.writeLimbRecord(self.data_node, self.limb_record)
+        limb_registry.tagLimbNode(self.data_node)
+
+
+def _splitNames(fields):
+
+    """Turns fields holding one or several names (space or comma separated) into a single chain"""
+
+    return tuple(name for field in fields for name in field.replace(',', ' ').split())
+
+
+def _checkData(data):
+
+    """Errors out on missing or mismatched limb data, before anything gets written"""
+
+    if not data[0] or not data[1]:
+        cmds.error("Missing piece(s) of info")
+
+    chains = [_splitNames(data[start:start + 3]) for start in (2, 5, 8, 11)]
+    if not all(chains):
+        cmds.error("Missing piece(s) of info")
+
+    # Each control matches the joint at the same position on the other side
+    ik_joints, ik_controls, fk_joints, fk_controls = chains
+    if len(ik_controls) != len(fk_joints) or len(fk_controls) != len(ik_joints):
+        cmds.error("Chains don't line up: %d ik controls for %d fk joints, %d fk controls for %d ik joints"
+                   % (len(ik_controls), len(fk_joints), len(fk_controls), len(ik_joints)))
+
+
+def _limbNames():
+
+    """Lists the limbs saved in the scene"""
+
+    return limb_registry.getRegistry().names()
+
+
+def _databaseProcess(raw_data_list, template=False):
         # Process data
         data = []
         for i in raw_data_list:
             data.append(i.text())
         
-        # Create class data
-        match_data = MatchData(data)
+        # Check the data is complete before writing anything
+        _checkData(data)
 
-        # Check if any piece of data is empty
-        for data in match_data.data:
-            if len(data) == 0:
-                cmds.error("Missing piece(s) of info")
+        # Create class data
+        match_data = MatchData(data, template)
 
         # Close the window
+        from ..ui import matchData_UI
         matchData_UI._maya_delete_ui()
 
 
-def _matchProcess(combo_box):
+def _matchProcess(combo_box, bake=False, on_keys=False):
     # Get the limb
-    combo_item = combo_box.currentText() + '_DATA'
+    combo_item = combo_box.currentText()
     #data_path = Path(Path(__file__).parents[1]) / 'rigs_data' / combo_item
 
     if len(combo_box.currentText()) == 0:
         cmds.error("No Limb selected, run the Get Data function first")
 
-    # Query limb data
-    data_query = {"blend_attr": cmds.getAttr(combo_item+'.blend_attr'),
-                          "fk_blend_value": float(cmds.getAttr(combo_item+'.fk_blend_value')),
-                          "ik_blend_value": float(cmds.getAttr(combo_item+'.ik_blend_value')),
-                          "ik_controls": (cmds.getAttr(combo_item+'.ik_control_01'), cmds.getAttr(combo_item+'.ik_control_02'), cmds.getAttr(combo_item+'.ik_control_03')), 
-                          "ik_joints": (cmds.getAttr(combo_item+'.ik_joint_01'), cmds.getAttr(combo_item+'.ik_joint_02'), cmds.getAttr(combo_item+'.ik_joint_03')), 
-                          "fk_controls": (cmds.getAttr(combo_item+'.fk_control_01'), cmds.getAttr(combo_item+'.fk_control_02'), cmds.getAttr(combo_item+'.fk_control_03')),
-                          "fk_joints": (cmds.getAttr(combo_item+'.fk_joint_01'), cmds.getAttr(combo_item+'.fk_joint_02'), cmds.getAttr(combo_item+'.fk_joint_03'))}
-
-    # Get current blend value
-    current_blend_value = cmds.getAttr(data_query['blend_attr'])
-
-    # Create matcher object
-    matcher = Match(data_query['blend_attr'], data_query['fk_blend_value'], data_query['ik_blend_value'], data_query['ik_controls'], data_query['ik_joints'], data_query['fk_controls'], data_query['fk_joints'])
-
-    # Figure out which way it should go
-    if current_blend_value == data_query['fk_blend_value']:
-        matcher.FKtoIK()
-    elif current_blend_value == data_query['ik_blend_value']:
-        matcher.IKtoFK()
-    else:
-        pass
+    # Match it, mid-blend limbs go to their closest side
+    matchLimbs([combo_item], bake, on_keys=on_keys)
+
+
+def _matchAllProcess(bake=False, on_keys=False):
+    # Match the limbs touched by the selection, or the whole character when nothing is selected
+    names = _selectedLimbs() or None
+    if not matchLimbs(names, bake, on_keys=on_keys):
+        cmds.warning("No limb matched, run the Get Data function first or blend the limbs fully to IK or FK")
+
+
+def _selectedLimbs():
+
+    """Lists the limbs with a control or joint in the selection"""
+
+    selected_nodes = cmds.ls(selection=True) or []
+    selection = set(selected_nodes)
+    if not selection:
+        return []
+
+    registry = limb_registry.getRegistry()
+    limbs = []
+    for name in registry.names():
+        record = registry.record(name)
+        nodes = set(record.ik_controls + record.ik_joints + record.fk_controls + record.fk_joints)
+        if not record.template:
+            if selection.intersection(nodes):
+                limbs.append(name)
+            continue
+
+        # Templates give the instances the selected nodes belong to
+        for selected in selected_nodes:
+            namespace, _, node = selected.split('|')[-1].rpartition(':')
+            instance = limb_record.addNamespace(name, namespace)
+            if node in nodes and instance not in limbs:
+                limbs.append(instance)
+    return limbs
+
+
+@contextmanager
+def _undoChunk(name):
+
+    """Groups every change made inside into a single undo step"""
+
+    cmds.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
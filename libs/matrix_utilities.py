@@ -0,0 +1,332 @@
+import numpy as np
+
+
+# Maya's rotateOrder enum, in attribute order
+ROTATE_ORDERS = ('xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx')
+
+# Axis indices of each rotate order, first rotated axis first
+_ORDER_AXES = tuple(tuple('xyz'.index(axis) for axis in order) for order in ROTATE_ORDERS)
+
+# Even permutations of xyz extract with a positive sign, odd ones with a negative sign
+_ORDER_PARITY = (1.0, 1.0, 1.0, -1.0, -1.0, -1.0)
+
+# Below this cosine the middle rotation is considered to be in gimbal lock
+_GIMBAL_EPSILON = 1e-9
+
+
+def asMatrices(values):
+
+    """Turns flat 16 float lists (as returned by maya) into (..., 4, 4) row-major matrices"""
+
+    values = np.asarray(values, dtype=np.float64)
+    return values.reshape(values.shape[:-1] + (4, 4))
+
+
+def inverseMatrices(matrices):
+
+    """Inverts a stack of (..., 4, 4) matrices"""
+
+    return np.linalg.inv(matrices)
+
+
+def localMatrices(world_matrices, parent_world_matrices):
+
+    """Expresses world matrices in the space of their parents (maya row-vector convention)"""
+
+    return world_matrices @ inverseMatrices(parent_world_matrices)
+
+
+def axisRotations(angles, axis):
+
+    """Builds row-vector rotation matrices of shape (..., 3, 3) around a single axis (angles in radians)"""
+
+    angles = np.asarray(angles, dtype=np.float64)
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    matrices = np.zeros(angles.shape + (3, 3))
+
+    # The two axes spinning around the rotation axis
+    a, b = [i for i in range(3) if i != axis]
+    # Maya's row-vector convention puts the positive sine above the diagonal for x and z,
+    # and below it for y, which is the transposed form of the usual column-vector matrices
+    sign = -1.0 if axis == 1 else 1.0
+    matrices[..., axis, axis] = 1.0
+    matrices[..., a, a] = cos
+    matrices[..., b, b] = cos
+    matrices[..., a, b] = sign * sin
+    matrices[..., b, a] = -sign * sin
+    return matrices
+
+
+def eulerToRotations(rotates, rotate_orders):
+
+    """Turns (..., 3) euler angles in degrees into (..., 3, 3) rotation matrices"""
+
+    rotates = np.radians(np.asarray(rotates, dtype=np.float64))
+    rotate_orders = np.broadcast_to(np.asarray(rotate_orders, dtype=np.int64), rotates.shape[:-1])
+    rotations = np.empty(rotates.shape[:-1] + (3, 3))
+
+    # Build each rotate order in one vectorized pass
+    for order in np.unique(rotate_orders):
+        mask = rotate_orders == order
+        first, second, third = _ORDER_AXES[order]
+        angles = rotates[mask]
+        rotations[mask] = (axisRotations(angles[..., first], first)
+                           @ axisRotations(angles[..., second], second)
+                           @ axisRotations(angles[..., third], third))
+    return rotations
+
+
+def rotationsToEuler(rotations, rotate_orders):
+
+    """Extracts (..., 3) euler angles in degrees from (..., 3, 3) pure rotation matrices"""
+
+    rotations = np.asarray(rotations, dtype=np.float64)
+    rotate_orders = np.broadcast_to(np.asarray(rotate_orders, dtype=np.int64), rotations.shape[:-2])
+    rotates = np.empty(rotations.shape[:-2] + (3,))
+
+    for order in np.unique(rotate_orders):
+        mask = rotate_orders == order
+        i, j, k = _ORDER_AXES[order]
+        parity = _ORDER_PARITY[order]
+        # Work on the column-vector form, where the chain reads third @ second @ first
+        column = np.swapaxes(rotations[mask], -1, -2)
+
+        second = np.arcsin(np.clip(-parity * column[..., k, i], -1.0, 1.0))
+        first = np.arctan2(parity * column[..., k, j], column[..., k, k])
+        third = np.arctan2(parity * column[..., j, i], column[..., i, i])
+
+        # In gimbal lock the first and third axes are aligned, give everything to the first one
+        locked = np.cos(second) < _GIMBAL_EPSILON
+        if np.any(locked):
+            first[locked] = np.arctan2(-parity * column[locked][..., j, k], column[locked][..., j, j])
+            third[locked] = 0.0
+
+        angles = np.empty(column.shape[:-2] + (3,))
+        angles[..., i] = first
+        angles[..., j] = second
+        angles[..., k] = third
+        rotates[mask] = angles
+    return np.degrees(rotates)
+
+
+def composeMatrices(translates, rotates, rotate_orders, scales=None):
+
+    """Builds (..., 4, 4) matrices from translations, euler rotations in degrees and optional scales"""
+
+    translates = np.asarray(translates, dtype=np.float64)
+    rotations = eulerToRotations(rotates, rotate_orders)
+    if scales is not None:
+        rotations = np.asarray(scales, dtype=np.float64)[..., :, None] * rotations
+
+    matrices = np.zeros(translates.shape[:-1] + (4, 4))
+    matrices[..., :3, :3] = rotations
+    matrices[..., 3, :3] = translates
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def decomposeMatrices(matrices, rotate_orders, rotate_axes=None, joint_orients=None, pivots=None):
+
+    """Splits (..., 4, 4) local matrices into translations, euler rotations in degrees and scales.
+
+    Matrices are read as maya composes transforms, [S][RA][R][JO][T], so the rotations
+    come out as rotate channel values once the (..., 3) rotateAxis and jointOrient
+    values (degrees, None for zeros) are taken out. pivots optionally holds (..., 3)
+    rotatePivot, rotatePivotTranslate, scalePivot and scalePivotTranslate values, taken
+    out of the translations as maya composes transforms with pivots,
+    [-SP][S][SP][SPT][-RP][RA][R][RP][RPT][T]. Shear is left out.
+    """
+
+    matrices = np.asarray(matrices, dtype=np.float64)
+    translates = matrices[..., 3, :3].copy()
+
+    # Each row of the upper 3x3 is an axis scaled by its scale value
+    axes = matrices[..., :3, :3]
+    scales = np.linalg.norm(axes, axis=-1)
+    # Mirrored matrices carry their negative scale on x
+    mirrored = np.linalg.det(axes) < 0.0
+    scales[..., 0] = np.where(mirrored, -scales[..., 0], scales[..., 0])
+    rotations = axes / scales[..., :, None]
+
+    # What the pivots add to the translation once scaled and rotated
+    if pivots is not None:
+        rotate_pivots, rotate_pivot_translates, scale_pivots, scale_pivot_translates = (
+            np.asarray(values, dtype=np.float64) for values in pivots)
+        pivot_offsets = scale_pivots - scale_pivots * scales + scale_pivot_translates - rotate_pivots
+        translates -= (pivot_offsets[..., None, :] @ rotations)[..., 0, :] + rotate_pivots + rotate_pivot_translates
+
+    # Peel the rotate axis off the front and the joint orient off the back, both always xyz
+    if rotate_axes is not None:
+        rotations = np.swapaxes(eulerToRotations(rotate_axes, 0), -1, -2) @ rotations
+    if joint_orients is not None:
+        rotations = rotations @ np.swapaxes(eulerToRotations(joint_orients, 0), -1, -2)
+
+    rotates = rotationsToEuler(rotations, rotate_orders)
+    return translates, rotates, scales
+
+
+def filterEuler(rotates, rotate_orders, axis=0):
+
+    """Removes the 180/360 degree flips of euler rotations in degrees along an axis (frames by default).
+
+    Each frame picks, between its rotation and the equivalent one flipping the middle axis,
+    the 360 degree wrap closest to the previous filtered frame. The whole array is
+    processed at once, only the walk along the filtered axis is sequential.
+    """
+
+    rotates = np.moveaxis(np.asarray(rotates, dtype=np.float64), axis, 0)
+    rotate_orders = np.broadcast_to(np.asarray(rotate_orders, dtype=np.int64), rotates.shape[1:-1])
+
+    # (a, b, c) and (a + 180, 180 - b, c + 180) give the same rotation, b being the middle axis
+    middle_axes = np.array([order_axes[1] for order_axes in _ORDER_AXES])[rotate_orders]
+    middle = np.arange(3) == middle_axes[..., None]
+    flipped_rotates = np.where(middle, 180.0 - rotates, rotates + 180.0)
+
+    filtered = np.empty_like(rotates)
+    if len(rotates):
+        filtered[0] = rotates[0]
+    for frame in range(1, len(rotates)):
+        previous = filtered[frame - 1]
+        candidates = np.stack((rotates[frame], flipped_rotates[frame]))
+        # Wrap each channel next to the previous frame
+        candidates = candidates - 360.0 * np.round((candidates - previous) / 360.0)
+        distances = np.abs(candidates - previous).sum(axis=-1)
+        filtered[frame] = np.where((distances[1] < distances[0])[..., None], candidates[1], candidates[0])
+    return np.moveaxis(filtered, 0, axis)
+
+
+def poleVectorPositions(root_positions, mid_positions, end_positions, distance=None, fallback_positions=None):
+
+    """Places pole vectors on the chain plane, pushed out from the middle joint.
+
+    Works on (..., 3) positions so a whole frame range is solved at once. The pole sits
+    along the perpendicular from the root-end line to the middle joint, at distance
+    (the chain length where it is None or nan). Straight chains have no plane, they keep the side
+    given by fallback_positions (usually the current pole positions).
+    """
+
+    root_positions = np.asarray(root_positions, dtype=np.float64)
+    mid_positions = np.asarray(mid_positions, dtype=np.float64)
+    end_positions = np.asarray(end_positions, dtype=np.float64)
+
+    # Project the middle joint on the root-end line
+    chain_vectors = end_positions - root_positions
+    chain_lengths = np.linalg.norm(chain_vectors, axis=-1, keepdims=True)
+    chain_directions = chain_vectors / np.maximum(chain_lengths, 1e-12)
+    projections = np.sum((mid_positions - root_positions) * chain_directions, axis=-1, keepdims=True)
+    projected_positions = root_positions + projections * chain_directions
+    pole_directions = mid_positions - projected_positions
+
+    # Straight chains fall back on the side of the given positions
+    if fallback_positions is not None:
+        straight = np.linalg.norm(pole_directions, axis=-1, keepdims=True) < 1e-6 * np.maximum(chain_lengths, 1.0)
+        pole_directions = np.where(straight, np.asarray(fallback_positions, dtype=np.float64) - projected_positions, pole_directions)
+
+    pole_lengths = np.linalg.norm(pole_directions, axis=-1, keepdims=True)
+    pole_directions = pole_directions / np.maximum(pole_lengths, 1e-12)
+
+    bone_lengths = (np.linalg.norm(mid_positions - root_positions, axis=-1, keepdims=True)
+                    + np.linalg.norm(end_positions - mid_positions, axis=-1, keepdims=True))
+    if distance is None:
+        distance = bone_lengths
+    else:
+        distance = np.where(np.isnan(distance), bone_lengths, distance)
+    return mid_positions + pole_directions * distance
+
+
+def matrixResiduals(matrices, target_matrices):
+
+    """Measures how far (..., 4, 4) matrices are from their targets.
+
+    Returns (...) arrays of the distance between their positions and of the angle in
+    degrees between their orientations, scale and shear left out.
+    """
+
+    translate_residuals = np.linalg.norm(target_matrices[..., 3, :3] - matrices[..., 3, :3], axis=-1)
+
+    # Angle of the rotation taking one orientation onto the other
+    rotations = matrices[..., :3, :3] / np.maximum(np.linalg.norm(matrices[..., :3, :3], axis=-1, keepdims=True), 1e-12)
+    target_rotations = (target_matrices[..., :3, :3]
+                        / np.maximum(np.linalg.norm(target_matrices[..., :3, :3], axis=-1, keepdims=True), 1e-12))
+    cosines = (np.einsum('...ij,...ij->...', rotations, target_rotations) - 1.0) / 2.0
+    rotate_residuals = np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+    return translate_residuals, rotate_residuals
+
+
+def rotationsToQuaternions(rotations):
+
+    """Turns (..., 3, 3) rotation matrices into (..., 4) unit quaternions, stored x, y, z, w"""
+
+    m = np.asarray(rotations, dtype=np.float64)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+    trace = m00 + m11 + m22
+
+    # Build the quaternion from its largest component, the others are then well conditioned
+    candidates = np.stack((np.stack((m21 - m12, m02 - m20, m10 - m01, 1.0 + trace), axis=-1),
+                           np.stack((1.0 + m00 - m11 - m22, m01 + m10, m02 + m20, m21 - m12), axis=-1),
+                           np.stack((m01 + m10, 1.0 - m00 + m11 - m22, m12 + m21, m02 - m20), axis=-1),
+                           np.stack((m02 + m20, m12 + m21, 1.0 - m00 - m11 + m22, m10 - m01), axis=-1)), axis=-2)
+    choices = np.argmax(np.stack((trace, m00, m11, m22), axis=-1), axis=-1)
+    quaternions = np.take_along_axis(candidates, choices[..., None, None], axis=-2)[..., 0, :]
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def quaternionsToRotations(quaternions):
+
+    """Turns (..., 4) unit quaternions (x, y, z, w) back into (..., 3, 3) rotation matrices"""
+
+    x, y, z, w = np.moveaxis(np.asarray(quaternions, dtype=np.float64), -1, 0)
+    return np.stack((np.stack((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - z * w), 2.0 * (x * z + y * w)), axis=-1),
+                     np.stack((2.0 * (x * y + z * w), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - x * w)), axis=-1),
+                     np.stack((2.0 * (x * z - y * w), 2.0 * (y * z + x * w), 1.0 - 2.0 * (x * x + y * y)), axis=-1)),
+                    axis=-2)
+
+
+def slerpQuaternions(quaternions, target_quaternions, weights):
+
+    """Interpolates (..., 4) unit quaternions towards targets along the shortest arc, weights being (...) in [0, 1]"""
+
+    weights = np.asarray(weights, dtype=np.float64)[..., None]
+    dots = np.sum(quaternions * target_quaternions, axis=-1, keepdims=True)
+
+    # q and -q are the same rotation, go the short way round
+    target_quaternions = np.where(dots < 0.0, -target_quaternions, target_quaternions)
+    angles = np.arccos(np.clip(np.abs(dots), 0.0, 1.0))
+    sines = np.sin(angles)
+
+    # Nearly equal rotations fall back on a plain lerp
+    close = sines < 1e-6
+    safe_sines = np.where(close, 1.0, sines)
+    source_weights = np.where(close, 1.0 - weights, np.sin((1.0 - weights) * angles) / safe_sines)
+    target_weights = np.where(close, weights, np.sin(weights * angles) / safe_sines)
+    blended = source_weights * quaternions + target_weights * target_quaternions
+    return blended / np.linalg.norm(blended, axis=-1, keepdims=True)
+
+
+def blendMatrices(matrices, target_matrices, weights):
+
+    """Blends (..., 4, 4) matrices towards targets the way an orient and a point constraint would.
+
+    Orientations are slerped, positions and scales lerped, with (...) weights in [0, 1].
+    Shear is left out.
+    """
+
+    weights = np.asarray(weights, dtype=np.float64)
+    scales = np.linalg.norm(matrices[..., :3, :3], axis=-1)
+    target_scales = np.linalg.norm(target_matrices[..., :3, :3], axis=-1)
+
+    quaternions = rotationsToQuaternions(matrices[..., :3, :3] / np.maximum(scales, 1e-12)[..., None])
+    target_quaternions = rotationsToQuaternions(target_matrices[..., :3, :3]
+                                                / np.maximum(target_scales, 1e-12)[..., None])
+
+    blended_matrices = np.zeros(np.broadcast_shapes(matrices.shape, target_matrices.shape))
+    blended_scales = scales + (target_scales - scales) * weights[..., None]
+    blended_matrices[..., :3, :3] = (quaternionsToRotations(slerpQuaternions(quaternions, target_quaternions, weights))
+                                     * blended_scales[..., None])
+    blended_matrices[..., 3, :3] = (matrices[..., 3, :3]
+                                    + (target_matrices[..., 3, :3] - matrices[..., 3, :3]) * weights[..., None])
+    blended_matrices[..., 3, 3] = 1.0
+    return blended_matrices
@@ -0,0 +1,596 @@
+"""Reads and writes the transforms touched by matching, through maya.cmds or the OpenMaya 2.0 API.
+
+Both implementations expose the same methods so Match does not care which one runs:
+
+    from match_IK_FK.libs import scene_io
+    scene_io.setSceneIO('api')
+"""
+
+import numpy as np
+
+from . import cmds_backend
+from . import matrix_utilities
+from .cmds_backend import cmds
+
+
+# Channels written by matching
+TRANSFORM_CHANNELS = ('translateX', 'translateY', 'translateZ', 'rotateX', 'rotateY', 'rotateZ')
+
+# Pivots of a transform, in the order readPivots returns them
+PIVOT_ATTRIBUTES = ('rotatePivot', 'rotatePivotTranslate', 'scalePivot', 'scalePivotTranslate')
+
+# Tangent types keys can be written with, 'global' follows maya's preferences
+TANGENT_TYPES = ('global', 'auto', 'spline', 'linear', 'flat', 'clamped', 'plateau', 'step')
+
+
+class CmdsSceneIO():
+
+    """Scene access through maya.cmds (or any cmds-like backend)"""
+
+    name = 'cmds'
+
+
+    def readMatrices(self, nodes, attribute):
+
+        """Reads worldMatrix or parentMatrix of each node into a (n, 4, 4) array"""
+
+        return matrix_utilities.asMatrices([cmds.getAttr('%s.%s[0]' % (node, attribute)) for node in nodes])
+
+
+    def sampleMatrices(self, nodes, attribute, times):
+
+        """Evaluates worldMatrix or parentMatrix of each node at each time into a (times, n, 4, 4) array,
+        without changing the current time"""
+
+        return matrix_utilities.asMatrices([[cmds.getAttr('%s.%s[0]' % (node, attribute), time=time) for node in nodes]
+                                            for time in times])
+
+
+    def sampleAttributes(self, attributes, times):
+
+        """Evaluates each numeric 'node.attribute' at each time into a (times, n) array, without changing the current time"""
+
+        return np.array([[cmds.getAttr(attribute, time=time) for attribute in attributes] for time in times],
+                        dtype=np.float64).reshape(len(times), len(attributes))
+
+
+    def readRotateOrders(self, nodes):
+
+        """Reads the rotate order of each node"""
+
+        return [cmds.getAttr(node + '.rotateOrder') for node in nodes]
+
+
+    def readRotateSpaces(self, nodes):
+
+        """Reads rotateAxis and jointOrient (zeros off joints) of each node as (n, 3) arrays in degrees"""
+
+        rotate_axes = []
+        joint_orients = []
+        for node in nodes:
+            rotate_axes.append(cmds.getAttr(node + '.rotateAxis')[0])
+            try:
+                joint_orients.append(cmds.getAttr(node + '.jointOrient')[0])
+            except ValueError:
+                joint_orients.append((0.0, 0.0, 0.0))
+        return np.reshape(rotate_axes, (-1, 3)).astype(np.float64), np.reshape(joint_orients, (-1, 3)).astype(np.float64)
+
+
+    def readPivots(self, nodes):
+
+        """Reads rotatePivot, rotatePivotTranslate, scalePivot and scalePivotTranslate of each node
+        as (n, 3) arrays, zeros on joints which don't use them"""
+
+        pivots = np.zeros((len(PIVOT_ATTRIBUTES), len(nodes), 3))
+        for i, node in enumerate(nodes):
+            if cmds.nodeType(node) == 'joint':
+                continue
+            for j, attribute in enumerate(PIVOT_ATTRIBUTES):
+                pivots[j, i] = cmds.getAttr(node + '.' + attribute)[0]
+        return tuple(pivots)
+
+
+    def readTransforms(self, nodes):
+
+        """Reads translate and rotate (degrees) of each node as (n, 3) arrays"""
+
+        translates = [cmds.getAttr(node + '.translate')[0] for node in nodes]
+        rotates = [cmds.getAttr(node + '.rotate')[0] for node in nodes]
+        return np.reshape(translates, (-1, 3)).astype(np.float64), np.reshape(rotates, (-1, 3)).astype(np.float64)
+
+
+    def readLongNames(self, nodes):
+
+        """Reads the full DAG path of each node"""
+
+        return [cmds.ls(node, long=True)[0] for node in nodes]
+
+
+    def readLockedChannels(self, nodes):
+
+        """Lists the locked transform channels of each node, locked compounds lock their children"""
+
+        locked_channels = []
+        for node in nodes:
+            locked = cmds.listAttr(node, locked=True) or []
+            locked_channels.append({channel for channel in TRANSFORM_CHANNELS
+                                    if channel in locked or channel[:-1] in locked})
+        return locked_channels
+
+
+    def writeTransforms(self, nodes, translates, rotates):
+
+        """Sets translate and rotate (degrees) on each node, skipping locked channels"""
+
+        for node, locked, translate, rotate in zip(nodes, self.readLockedChannels(nodes), translates, rotates):
+            for attribute, values in (('translate', translate), ('rotate', rotate)):
+                channels = [attribute + axis for axis in 'XYZ']
+                if not locked.intersection(channels):
+                    cmds.setAttr('%s.%s' % (node, attribute), *values)
+                    continue
+                for channel, value in zip(channels, values):
+                    if channel not in locked:
+                        cmds.setAttr('%s.%s' % (node, channel), value)
+
+
+    def readAttributes(self, attributes):
+
+        """Reads the value of each numeric 'node.attribute'"""
+
+        return [cmds.getAttr(attribute) for attribute in attributes]
+
+
+    def writeAttributes(self, attributes, values):
+
+        """Sets the value of each numeric 'node.attribute'"""
+
+        for attribute, value in zip(attributes, values):
+            cmds.setAttr(attribute, value)
+
+
+    def readKeyTimes(self, nodes):
+
+        """Lists the sorted union of the key times of every curve of the nodes, one query per node"""
+
+        times = set()
+        for node in nodes:
+            times.update(cmds.keyframe(node, q=True, timeChange=True) or [])
+        return sorted(times)
+
+
+    def writeKeys(self, nodes, frames, translates, rotates, tangent='global', keep=None, span=None):
+
+        """Keys translate and rotate (degrees) of each node from (frames, n, 3) arrays, skipping locked channels.
+
+        keep optionally masks the keys to write with a (frames, n, 6) array, translates first.
+        Keys already within span (the first to the last frame by default) are cleared from
+        every channel getting keys, channels getting none are left untouched.
+        """
+
+        flags = _tangentFlags(tangent)
+        span = _keySpan(frames, span)
+        for i, (node, locked) in enumerate(zip(nodes, self.readLockedChannels(nodes))):
+            for channel, channel_frames, values in _channelKeys(frames, translates[:, i], rotates[:, i], keep, i):
+                if channel not in locked and len(channel_frames):
+                    cmds.cutKey(node, attribute=channel, time=span, clear=True)
+                    _keyChannel(node, channel, channel_frames, values, flags)
+
+
+class ApiSceneIO():
+
+    """Scene access through OpenMaya 2.0, with nodes resolved once to cached DAG paths and plugs.
+
+    Writes made here bypass maya's undo queue, matching puts its switches and bakes back
+    in it through transaction.commit.
+    """
+
+    name = 'api'
+
+
+    def __init__(self):
+        import maya.api.OpenMaya as om
+        import maya.api.OpenMayaAnim as oma
+        self.om = om
+        self.oma = oma
+        self._handles = {}
+        self._attribute_plugs = {}
+
+
+    def _resolve(self, node):
+
+        """Returns the cached (dag path, object handle, plugs) of a node, resolving it when needed"""
+
+        cached = self._handles.get(node)
+        if cached is not None and cached[1].isValid():
+            return cached
+
+        om = self.om
+        selection = om.MSelectionList()
+        selection.add(node)
+        dag_path = selection.getDagPath(0)
+        depend_node = om.MFnDependencyNode(dag_path.node())
+        plugs = {channel: depend_node.findPlug(channel, False) for channel in TRANSFORM_CHANNELS + ('rotateOrder',)}
+        for attribute in ('worldMatrix', 'parentMatrix'):
+            plugs[attribute] = depend_node.findPlug(attribute, False).elementByLogicalIndex(0)
+        for attribute in ('rotateAxis', 'jointOrient'):
+            if depend_node.hasAttribute(attribute):
+                plugs[attribute] = depend_node.findPlug(attribute, False)
+        # Joints don't use their pivots
+        if not dag_path.node().hasFn(om.MFn.kJoint):
+            for attribute in PIVOT_ATTRIBUTES:
+                plugs[attribute] = depend_node.findPlug(attribute, False)
+        cached = (dag_path, om.MObjectHandle(dag_path.node()), plugs)
+        self._handles[node] = cached
+        return cached
+
+
+    def readMatrices(self, nodes, attribute):
+
+        """Reads worldMatrix or parentMatrix of each node into a (n, 4, 4) array"""
+
+        matrices = np.empty((len(nodes), 4, 4))
+        for i, node in enumerate(nodes):
+            dag_path = self._resolve(node)[0]
+            matrix = dag_path.inclusiveMatrix() if attribute == 'worldMatrix' else dag_path.exclusiveMatrix()
+            matrices[i] = np.reshape(list(matrix), (4, 4))
+        return matrices
+
+
+    def sampleMatrices(self, nodes, attribute, times):
+
+        """Evaluates worldMatrix or parentMatrix of each node at each time into a (times, n, 4, 4) array,
+        through a time context instead of changing the current time"""
+
+        om = self.om
+        plugs = [self._resolve(node)[2][attribute] for node in nodes]
+        matrices = np.empty((len(times), len(nodes), 4, 4))
+        for i, time in enumerate(times):
+            context = om.MDGContext(om.MTime(time, om.MTime.uiUnit()))
+            # Maya 2022 and later evaluate plugs in the current context
+            previous_context = context.makeCurrent() if hasattr(context, 'makeCurrent') else None
+            try:
+                for j, plug in enumerate(plugs):
+                    data = plug.asMObject() if previous_context is not None else plug.asMObject(context)
+                    matrices[i, j] = np.reshape(list(om.MFnMatrixData(data).matrix()), (4, 4))
+            finally:
+                if previous_context is not None:
+                    previous_context.makeCurrent()
+        return matrices
+
+
+    def sampleAttributes(self, attributes, times):
+
+        """Evaluates each numeric 'node.attribute' at each time into a (times, n) array,
+        through a time context instead of changing the current time"""
+
+        om = self.om
+        plugs = [self._attributePlug(attribute) for attribute in attributes]
+        values = np.empty((len(times), len(attributes)))
+        for i, time in enumerate(times):
+            context = om.MDGContext(om.MTime(time, om.MTime.uiUnit()))
+            # Maya 2022 and later evaluate plugs in the current context
+            previous_context = context.makeCurrent() if hasattr(context, 'makeCurrent') else None
+            try:
+                for j, plug in enumerate(plugs):
+                    values[i, j] = plug.asDouble() if previous_context is not None else plug.asDouble(context)
+            finally:
+                if previous_context is not None:
+                    previous_context.makeCurrent()
+        return values
+
+
+    def readRotateOrders(self, nodes):
+
+        """Reads the rotate order of each node"""
+
+        return [self._resolve(node)[2]['rotateOrder'].asInt() for node in nodes]
+
+
+    def readRotateSpaces(self, nodes):
+
+        """Reads rotateAxis and jointOrient (zeros off joints) of each node as (n, 3) arrays in degrees"""
+
+        spaces = np.zeros((2, len(nodes), 3))
+        for i, node in enumerate(nodes):
+            plugs = self._resolve(node)[2]
+            for j, attribute in enumerate(('rotateAxis', 'jointOrient')):
+                if attribute in plugs:
+                    spaces[j, i] = [plugs[attribute].child(axis).asMAngle().asDegrees() for axis in range(3)]
+        return spaces[0], spaces[1]
+
+
+    def readPivots(self, nodes):
+
+        """Reads rotatePivot, rotatePivotTranslate, scalePivot and scalePivotTranslate of each node
+        as (n, 3) arrays, zeros on joints which don't use them"""
+
+        pivots = np.zeros((len(PIVOT_ATTRIBUTES), len(nodes), 3))
+        for i, node in enumerate(nodes):
+            plugs = self._resolve(node)[2]
+            for j, attribute in enumerate(PIVOT_ATTRIBUTES):
+                if attribute in plugs:
+                    pivots[j, i] = [plugs[attribute].child(axis).asDouble() for axis in range(3)]
+        return tuple(pivots)
+
+
+    def readTransforms(self, nodes):
+
+        """Reads translate and rotate (degrees) of each node as (n, 3) arrays"""
+
+        transforms = np.zeros((2, len(nodes), 3))
+        for i, node in enumerate(nodes):
+            plugs = self._resolve(node)[2]
+            for axis_index, axis in enumerate('XYZ'):
+                transforms[0, i, axis_index] = plugs['translate' + axis].asDouble()
+                transforms[1, i, axis_index] = plugs['rotate' + axis].asMAngle().asDegrees()
+        return transforms[0], transforms[1]
+
+
+    def readLongNames(self, nodes):
+
+        """Reads the full DAG path of each node"""
+
+        return [self._resolve(node)[0].fullPathName() for node in nodes]
+
+
+    def readLockedChannels(self, nodes):
+
+        """Lists the locked transform channels of each node, locked compounds lock their children"""
+
+        locked_channels = []
+        for node in nodes:
+            plugs = self._resolve(node)[2]
+            locked_channels.append({channel for channel in TRANSFORM_CHANNELS
+                                    if plugs[channel].isLocked or plugs[channel].parent().isLocked})
+        return locked_channels
+
+
+    def writeTransforms(self, nodes, translates, rotates):
+
+        """Sets translate and rotate (degrees) on each node, skipping locked channels"""
+
+        om = self.om
+        for node, locked, translate, rotate in zip(nodes, self.readLockedChannels(nodes), translates, rotates):
+            plugs = self._resolve(node)[2]
+            for axis_index, axis in enumerate('XYZ'):
+                if 'translate' + axis not in locked:
+                    plugs['translate' + axis].setDouble(float(translate[axis_index]))
+                if 'rotate' + axis not in locked:
+                    plugs['rotate' + axis].setMAngle(om.MAngle(float(np.radians(rotate[axis_index]))))
+
+
+    def readAttributes(self, attributes):
+
+        """Reads the value of each numeric 'node.attribute'"""
+
+        return [self._attributePlug(attribute).asDouble() for attribute in attributes]
+
+
+    def writeAttributes(self, attributes, values):
+
+        """Sets the value of each numeric 'node.attribute'"""
+
+        for attribute, value in zip(attributes, values):
+            self._attributePlug(attribute).setDouble(float(value))
+
+
+    def _attributePlug(self, attribute):
+
+        """Returns the cached (object handle, plug) of a 'node.attribute' name, finding the plug when needed"""
+
+        cached = self._attribute_plugs.get(attribute)
+        if cached is not None and cached[0].isValid():
+            return cached[1]
+
+        selection = self.om.MSelectionList()
+        selection.add(attribute)
+        plug = selection.getPlug(0)
+        self._attribute_plugs[attribute] = (self.om.MObjectHandle(plug.node()), plug)
+        return plug
+
+
+    def readKeyTimes(self, nodes):
+
+        """Lists the sorted union of the key times of every curve of the nodes, reading the curves directly"""
+
+        om = self.om
+        oma = self.oma
+        unit = om.MTime.uiUnit()
+        times = set()
+        for node in nodes:
+            for curve_object in oma.MAnimUtil.findAnimation(self._resolve(node)[0].node()):
+                curve = oma.MFnAnimCurve(curve_object)
+                times.update(curve.input(i).asUnits(unit) for i in range(curve.numKeys))
+        return sorted(times)
+
+
+    def writeKeys(self, nodes, frames, translates, rotates, tangent='global', keep=None, span=None):
+
+        """Keys translate and rotate (degrees) of each node from (frames, n, 3) arrays, skipping locked channels.
+
+        keep optionally masks the keys to write with a (frames, n, 6) array, translates first.
+        Keys already within span (the first to the last frame by default) are cleared from
+        every channel getting keys, channels getting none are left untouched. Clearing the span
+        is what replaces keys: each channel then gets its keys in a single MFnAnimCurve.addKeys
+        call keeping the ones outside of it, like the cmds path. Channels driven by something
+        else than a curve (anim layers, pair blends) are keyed through maya commands instead.
+        Returns the _KeyEdits undoing and redoing the whole write.
+        """
+
+        om = self.om
+        oma = self.oma
+        edits = _KeyEdits(om.MDGModifier(), oma.MAnimCurveChange())
+        flags = _tangentFlags(tangent)
+        tangent_type = getattr(oma.MFnAnimCurve, _API_TANGENTS[tangent])
+        # Step only exists as an out tangent
+        in_tangent_type = oma.MFnAnimCurve.kTangentGlobal if tangent == 'step' else tangent_type
+        unit = om.MTime.uiUnit()
+        span = _keySpan(frames, span)
+
+        for i, (node, locked) in enumerate(zip(nodes, self.readLockedChannels(nodes))):
+            plugs = self._resolve(node)[2]
+            for channel, channel_frames, values in _channelKeys(frames, translates[:, i], rotates[:, i], keep, i):
+                if channel in locked or not len(channel_frames):
+                    continue
+                curve = self._animCurve(plugs[channel], channel.startswith('rotate'), edits.modifier)
+                if curve is None:
+                    # The modifier runs the commands, and undoes them with the rest
+                    for command in _keyCommands(node + '.' + channel, channel_frames, values, flags, span):
+                        edits.modifier.commandToExecute(command)
+                    continue
+                # Clear the span, last keys first so indices stay valid
+                for key_index in reversed(range(curve.numKeys)):
+                    if span[0] <= curve.input(key_index).asUnits(unit) <= span[1]:
+                        curve.remove(key_index, edits.curve_change)
+                # Angular curves hold radians
+                if channel.startswith('rotate'):
+                    values = np.radians(values)
+                times = om.MTimeArray([om.MTime(float(frame), unit) for frame in channel_frames])
+                curve.addKeys(times, om.MDoubleArray([float(value) for value in values]),
+                              in_tangent_type, tangent_type, True, edits.curve_change)
+        edits.modifier.doIt()
+        return edits
+
+
+    def _animCurve(self, plug, angular, modifier):
+
+        """Returns the curve driving a plug, None when something else drives it. Free plugs get a new
+        curve, created and connected through modifier so it is undone with the keys"""
+
+        om = self.om
+        oma = self.oma
+        source = plug.source()
+        if source.isNull:
+            curve_node = modifier.createNode('animCurveTA' if angular else 'animCurveTL')
+            modifier.connect(om.MFnDependencyNode(curve_node).findPlug('output', False), plug)
+            # Only runs what the modifier has not run yet
+            modifier.doIt()
+            return oma.MFnAnimCurve(curve_node)
+        if source.node().hasFn(om.MFn.kAnimCurve):
+            return oma.MFnAnimCurve(source.node())
+        return None
+
+
+class _KeyEdits():
+
+    """Curve edits and dependency graph changes made by ApiSceneIO.writeKeys, to undo and redo them"""
+
+    def __init__(self, modifier, curve_change):
+        self.modifier = modifier
+        self.curve_change = curve_change
+
+
+    def undoIt(self):
+
+        """Takes the keys out, then the curves and commands that came with them"""
+
+        self.curve_change.undoIt()
+        self.modifier.undoIt()
+
+
+    def redoIt(self):
+
+        """Puts the curves and commands back, then the keys"""
+
+        self.modifier.doIt()
+        self.curve_change.redoIt()
+
+
+# MFnAnimCurve tangent of each tangent type
+_API_TANGENTS = {'global': 'kTangentGlobal',
+                 'auto': 'kTangentAuto',
+                 'spline': 'kTangentSmooth',
+                 'linear': 'kTangentLinear',
+                 'flat': 'kTangentFlat',
+                 'clamped': 'kTangentClamped',
+                 'plateau': 'kTangentPlateau',
+                 'step': 'kTangentStep'}
+
+
+def _tangentFlags(tangent):
+
+    """Turns a tangent type into setKeyframe flags, maya's preferences need none"""
+
+    if tangent not in TANGENT_TYPES:
+        raise ValueError("Unknown tangent type %s, use one of %s" % (tangent, ', '.join(TANGENT_TYPES)))
+    if tangent == 'global':
+        return {}
+    # Step only exists as an out tangent
+    if tangent == 'step':
+        return {'outTangentType': 'step'}
+    return {'inTangentType': tangent, 'outTangentType': tangent}
+
+
+def _keySpan(frames, span):
+
+    """Returns the (start, end) time range keys get cleared from, the frames' own range by default"""
+
+    if span is not None:
+        return tuple(float(time) for time in span)
+    if not len(frames):
+        return (0.0, 0.0)
+    return float(frames[0]), float(frames[-1])
+
+
+def _channelKeys(frames, translates, rotates, keep, index):
+
+    """Lists (channel, frames, values) keys of a node from its (frames, 3) translates and rotates,
+    only the ones kept by a (frames, n, 6) mask when there is one"""
+
+    frames = np.asarray(frames)
+    channel_keys = []
+    for channel_index, channel in enumerate(TRANSFORM_CHANNELS):
+        values = (translates if channel_index < 3 else rotates)[:, channel_index % 3]
+        if keep is None:
+            channel_keys.append((channel, frames, values))
+        else:
+            mask = keep[:, index, channel_index]
+            channel_keys.append((channel, frames[mask], values[mask]))
+    return channel_keys
+
+
+def _keyCommands(plug, frames, values, flags, span):
+
+    """Lists the MEL commands clearing span on a plug and keying it, one setKeyframe per key"""
+
+    flag_string = ''.join(' -%s %s' % (flag, value) for flag, value in flags.items())
+    commands = ['cutKey -clear -time "%r:%r" %s' % (span[0], span[1], plug)]
+    commands += ['setKeyframe -time %r -value %r%s %s' % (float(frame), float(value), flag_string, plug)
+                 for frame, value in zip(frames, values)]
+    return commands
+
+
+def _keyChannel(node, channel, frames, values, flags):
+
+    """Keys a channel through maya.cmds, one command per key as there is nothing to write a whole curve"""
+
+    for frame, value in zip(frames, values):
+        cmds.setKeyframe(node, attribute=channel, time=frame, value=float(value), **flags)
+
+
+_SCENE_IOS = {'cmds': CmdsSceneIO,
+              'api': ApiSceneIO}
+
+_scene_io = None
+
+
+def setSceneIO(name):
+
+    """Selects how matching talks to the scene, either 'cmds' or 'api'"""
+
+    global _scene_io
+    if name not in _SCENE_IOS:
+        raise ValueError("Unknown scene io %s, use one of %s" % (name, ', '.join(_SCENE_IOS)))
+    if name == 'api' and not cmds_backend.isMaya():
+        raise RuntimeError("The api scene io needs a maya session")
+    _scene_io = _SCENE_IOS[name]()
+
+
+def getSceneIO():
+
+    """Returns the scene io in use, cmds until another one is selected"""
+
+    global _scene_io
+    if _scene_io is None or (_scene_io.name == 'api' and not cmds_backend.isMaya()):
+        _scene_io = CmdsSceneIO()
+    return _scene_io
@@ -0,0 +1,114 @@
+"""Applies the writes of a match as one transaction, holding only the values before and after it.
+
+Through maya.cmds the writes are already in the undo queue, the undo chunk opened by the
+caller groups them. Writes made by the api scene io are not, so they run inside
+matchIkFkUndo, a small undoable command (libs/undo_plugin.py) which keeps the transaction
+to undo and redo it as a single step.
+"""
+
+from pathlib import Path
+
+from . import cmds_backend
+from . import scene_io
+from .cmds_backend import cmds
+
+
+# Maya plugin registering the undoable command
+UNDO_PLUGIN = Path(__file__).with_name('undo_plugin.py')
+
+# Transaction waiting for the undoable command to pick it up
+_pending = None
+
+
+class Transaction():
+
+    """Writes of a match, each kept as a function writing its after state and one writing its before state"""
+
+    def __init__(self):
+        self._writes = []
+
+
+    def record(self, redo, undo):
+
+        """Adds a write to the transaction, not applied until the transaction is committed"""
+
+        self._writes.append((redo, undo))
+
+
+    def recordTransforms(self, scene, nodes, translates, rotates):
+
+        """Adds the translate and rotate values of nodes, reading the ones they have now to undo them"""
+
+        before = scene.readTransforms(nodes)
+        self.record(lambda: scene.writeTransforms(nodes, translates, rotates),
+                    lambda: scene.writeTransforms(nodes, *before))
+
+
+    def recordAttributes(self, scene, attributes, values):
+
+        """Adds the values of numeric attributes, reading the ones they have now to undo them"""
+
+        before = scene.readAttributes(attributes)
+        self.record(lambda: scene.writeAttributes(attributes, values),
+                    lambda: scene.writeAttributes(attributes, before))
+
+
+    def recordKeys(self, scene, nodes, frames, translates, rotates, tangent='global', keep=None, span=None):
+
+        """Adds baked keys, see writeKeys. The first redo writes them, the edits it hands back undo and redo them"""
+
+        edits = []
+
+        def redo():
+            if edits:
+                edits[0].redoIt()
+            else:
+                edits.append(scene.writeKeys(nodes, frames, translates, rotates, tangent, keep, span))
+
+        self.record(redo, lambda: edits[0].undoIt())
+
+
+    def redo(self):
+
+        """Writes the after state, in recording order"""
+
+        for redo, undo in self._writes:
+            redo()
+
+
+    def undo(self):
+
+        """Writes the before state back, in reverse recording order"""
+
+        for redo, undo in reversed(self._writes):
+            undo()
+
+
+def commit(transaction):
+
+    """Applies a transaction, as a single undo step when it goes through the api scene io"""
+
+    global _pending
+    if not cmds_backend.isMaya() or scene_io.getSceneIO().name != 'api':
+        transaction.redo()
+        return
+
+    if not cmds.pluginInfo(str(UNDO_PLUGIN), q=True, loaded=True):
+        cmds.loadPlugin(str(UNDO_PLUGIN), quiet=True)
+    _pending = transaction
+    try:
+        # The command finds the transaction through this module's name
+        cmds.matchIkFkUndo(__name__)
+    finally:
+        _pending = None
+
+
+def takePending():
+
+    """Hands the transaction being committed over to the undoable command"""
+
+    global _pending
+    transaction, _pending = _pending, None
+    if transaction is None:
+        raise RuntimeError("matchIkFkUndo only runs transactions committed through transaction.commit")
+    return transaction
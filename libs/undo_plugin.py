@@ -0,0 +1,55 @@
+"""Maya plugin registering matchIkFkUndo, which puts a match written through OpenMaya in the undo queue.
+
+Loaded on demand by transaction.commit. The command takes the name of the module holding
+the pending transaction, as maya imports this file on its own, outside of the package.
+"""
+
+import sys
+
+import maya.api.OpenMaya as om
+
+
+def maya_useNewAPI():
+
+    """Tells maya this plugin uses OpenMaya 2.0"""
+
+
+class MatchIkFkUndo(om.MPxCommand):
+
+    """Runs a transaction, then undoes and redoes it with maya's undo queue"""
+
+    name = 'matchIkFkUndo'
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.transaction = None
+
+
+    def doIt(self, args):
+        self.transaction = sys.modules[args.asString(0)].takePending()
+        self.redoIt()
+
+
+    def redoIt(self):
+        self.transaction.redo()
+
+
+    def undoIt(self):
+        self.transaction.undo()
+
+
+    def isUndoable(self):
+        return True
+
+
+    @staticmethod
+    def creator():
+        return MatchIkFkUndo()
+
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin).registerCommand(MatchIkFkUndo.name, MatchIkFkUndo.creator)
+
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(MatchIkFkUndo.name)
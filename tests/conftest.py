@@ -0,0 +1,38 @@
+"""Runs every test against a fresh in-memory scene, maya is not needed."""
+
+import pytest
+
+from helpers import importModule
+
+
+cmds_backend = importModule('libs.cmds_backend')
+evaluation = importModule('libs.evaluation')
+fake_cmds = importModule('libs.fake_cmds')
+limb_registry = importModule('libs.limb_registry')
+match_utilities = importModule('libs.match_utilities')
+scene_io = importModule('libs.scene_io')
+synthetic_rigs = importModule('benchmarks.synthetic_rigs')
+
+
+@pytest.fixture
+def scene():
+
+    """Plugs a new fake scene in, and unplugs it once the test is done"""
+
+    fake = fake_cmds.FakeCmds()
+    cmds_backend.setBackend(fake)
+    scene_io.setSceneIO('cmds')
+    evaluation.setEnabled(True)
+    yield fake
+    limb_registry.getRegistry().uninstall()
+    cmds_backend.setBackend(None)
+
+
+@pytest.fixture
+def arm(scene):
+
+    """Registers a two-bone limb sitting in IK and returns its record"""
+
+    match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'arm', seed=3))
+    return limb_registry.getRegistry().record('arm_switch')
+
@@ -0,0 +1,28 @@
+"""Imports the tool as a package for the tests, whatever its folder is called, and reads the fake scene."""
+
+import importlib
+import sys
+from pathlib import Path
+
+import numpy as np
+
+
+PACKAGE_PATH = Path(__file__).resolve().parents[1]
+if str(PACKAGE_PATH.parent) not in sys.path:
+    sys.path.insert(0, str(PACKAGE_PATH.parent))
+PACKAGE = PACKAGE_PATH.name
+
+
+def importModule(name):
+
+    """Imports a module of the tool from its path inside the package, like 'libs.scene_io'"""
+
+    return importlib.import_module(PACKAGE + '.' + name)
+
+
+def worldMatrices(scene, nodes, time=None):
+
+    """Reads the (n, 4, 4) world matrices of nodes, at the current time by default"""
+
+    kwargs = {} if time is None else {'time': time}
+    return np.array([np.reshape(scene.getAttr(node + '.worldMatrix[0]', **kwargs), (4, 4)) for node in nodes])
@@ -0,0 +1,56 @@
+import pytest
+
+from helpers import importModule
+
+
+evaluation = importModule('libs.evaluation')
+match_utilities = importModule('libs.match_utilities')
+
+
+def test_nested_batches_pause_once(scene):
+    with evaluation.suspendedEvaluation():
+        assert scene.viewport_paused
+        with evaluation.suspendedEvaluation():
+            assert scene.viewport_paused
+        # The inner batch leaves the outer one paused
+        assert scene.viewport_paused
+    assert not scene.viewport_paused
+    assert scene.calls['ogs'] == 3
+
+
+def test_viewport_comes_back_on_error(scene):
+    with pytest.raises(KeyError):
+        with evaluation.suspendedEvaluation():
+            with evaluation.suspendedEvaluation():
+                raise KeyError('arm')
+    assert not scene.viewport_paused
+    with evaluation.suspendedEvaluation():
+        assert scene.viewport_paused
+
+
+def test_paused_viewport_stays_paused(scene):
+    # Paused by the user or another tool before the batch
+    scene.ogs(pause=True)
+    with evaluation.suspendedEvaluation():
+        assert scene.viewport_paused
+    assert scene.viewport_paused
+
+
+def test_disabled(scene):
+    evaluation.setEnabled(False)
+    with evaluation.suspendedEvaluation():
+        assert not scene.viewport_paused
+    assert scene.calls['ogs'] == 0
+
+
+def test_timings(scene, arm):
+    evaluation.resetTimings()
+    report = {}
+    match_utilities.matchLimbs(report=report)
+    assert report['suspended_seconds'] > 0.0 and report['unsuspended_seconds'] == 0.0
+
+    evaluation.setEnabled(False)
+    match_utilities.matchLimbs()
+    timings = evaluation.timings()
+    assert timings['batches'] == 2
+    assert timings['suspension_saved_seconds'] == timings['unsuspended_seconds'] - timings['suspended_seconds']
@@ -0,0 +1,29 @@
+import multiprocessing.spawn
+import os
+
+import numpy as np
+
+from helpers import importModule
+
+
+cmds_backend = importModule('libs.cmds_backend')
+frame_pool = importModule('libs.frame_pool')
+
+
+def doubleFrames(factor, values):
+    return (values * factor,)
+
+
+def test_chunks_merge_in_frame_order():
+    values = np.arange(12.0).reshape(6, 2)
+    result, = frame_pool.mapFrames(doubleFrames, (2.0,), [values], [values.shape], processes=3)
+    np.testing.assert_allclose(result, values * 2.0)
+
+
+def test_mayapy_only_while_the_pool_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmds_backend, 'isMaya', lambda: True)
+    monkeypatch.setenv('MAYA_LOCATION', str(tmp_path))
+    previous = multiprocessing.spawn.get_executable()
+    with frame_pool._context():
+        assert os.path.dirname(os.fsdecode(multiprocessing.spawn.get_executable())) == os.path.join(str(tmp_path), 'bin')
+    assert multiprocessing.spawn.get_executable() == previous
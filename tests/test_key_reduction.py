@@ -0,0 +1,47 @@
+import numpy as np
+
+from helpers import importModule
+
+
+key_reduction = importModule('libs.key_reduction')
+
+
+def test_straight_curves_keep_their_ends():
+    frames = np.arange(1.0, 21.0)
+    values = np.stack((frames * 2.0, np.full(20, 5.0)), axis=-1)
+    keep, errors = key_reduction.reduceKeys(frames, values, 1e-6)
+    assert keep[[0, -1]].all()
+    assert not keep[1:-1].any()
+    np.testing.assert_allclose(errors, 0.0, atol=1e-9)
+
+
+def test_kept_keys_rebuild_the_curve_within_tolerance():
+    frames = np.arange(1.0, 101.0)
+    values = np.sin(frames / 7.0)[:, None] * [1.0, 10.0]
+    for tolerance in (0.1, 0.01, 0.001):
+        keep, errors = key_reduction.reduceKeys(frames, values, tolerance)
+        for curve in range(values.shape[1]):
+            kept = keep[:, curve]
+            rebuilt = np.interp(frames, frames[kept], values[kept, curve])
+            assert np.abs(rebuilt - values[:, curve]).max() <= tolerance
+            assert np.isclose(errors[curve], np.abs(rebuilt - values[:, curve]).max())
+        # The bigger curve needs more keys to stay within the same tolerance
+        assert keep[:, 1].sum() >= keep[:, 0].sum()
+
+
+def test_curves_are_reduced_independently():
+    frames = np.arange(1.0, 11.0)
+    values = np.zeros((10, 2, 3))
+    values[5, 1, 2] = 1.0
+    keep, errors = key_reduction.reduceKeys(frames, values, 0.5)
+    assert keep.shape == values.shape
+    assert keep[5, 1, 2]
+    assert keep.sum() == 2 * 6 + 3
+    assert errors.shape == (2, 3)
+
+
+def test_uneven_frames():
+    frames = np.array([1.0, 2.0, 10.0, 11.0])
+    values = frames[:, None] * 3.0
+    keep, errors = key_reduction.reduceKeys(frames, values, 1e-6)
+    assert keep[:, 0].tolist() == [True, False, False, True]
@@ -0,0 +1,165 @@
+import dataclasses
+
+import pytest
+
+from helpers import importModule
+
+
+cmds_backend = importModule('libs.cmds_backend')
+limb_record = importModule('libs.limb_record')
+limb_registry = importModule('libs.limb_registry')
+match_utilities = importModule('libs.match_utilities')
+synthetic_rigs = importModule('benchmarks.synthetic_rigs')
+
+
+def registerLimb(scene, name, **kwargs):
+
+    """Builds and registers a limb, returns its name in the registry"""
+
+    data = synthetic_rigs.buildLimb(scene, name)
+    match_utilities.MatchData(data, **kwargs)
+    return data[0]
+
+
+def test_record_round_trip():
+    record = limb_record.LimbRecord(blend_attr='arm_switch.ikFk', fk_blend_value=0.0, ik_blend_value=1.0,
+                                    ik_controls=('a', 'b', 'c'), ik_joints=('d', 'e', 'f'),
+                                    fk_controls=('g', 'h', 'i'), fk_joints=('j', 'k', 'l'),
+                                    ik_offsets=((1.0,) * 16,) * 3, pole_distance=12.0)
+    assert limb_record.LimbRecord.decode(record.encode()) == record
+
+
+def test_unknown_record_version():
+    with pytest.raises(ValueError):
+        limb_record.LimbRecord.decode('{"version": 999}')
+
+
+def test_legacy_record(scene):
+    node = scene.createNode('network', n='leg_switch_DATA')
+    values = dict(zip(limb_record.LEGACY_ATTRIBUTES[:3], ('leg_switch.ikFk', '0', '1')))
+    for side in ('ik', 'fk'):
+        for kind in ('control', 'joint'):
+            for i in (1, 2, 3):
+                values['%s_%s_%02d' % (side, kind, i)] = 'leg_%s_%s_%02d' % (side, kind, i)
+    for attribute, value in values.items():
+        scene.addAttr(node, ln=attribute, dt='string')
+        scene.setAttr('%s.%s' % (node, attribute), value, type='string')
+
+    assert limb_registry.getRegistry().names() == ['leg_switch']
+    record = limb_registry.getRegistry().record('leg_switch')
+    assert record.blend_attr == 'leg_switch.ikFk'
+    assert (record.fk_blend_value, record.ik_blend_value) == (0.0, 1.0)
+    assert record.ik_controls == ('leg_ik_control_01', 'leg_ik_control_02', 'leg_ik_control_03')
+    assert record.fk_joints == ('leg_fk_joint_01', 'leg_fk_joint_02', 'leg_fk_joint_03')
+    assert record.ik_offsets is None and record.pole_index == 1
+
+    # Matching a legacy limb works on identity offsets
+    assert match_utilities.Match.fromRecord(record).fk_offsets.shape == (3, 4, 4)
+
+
+def test_records_are_cached(scene):
+    name = registerLimb(scene, 'arm')
+    registry = limb_registry.getRegistry()
+    record = registry.record(name)
+    reads = scene.calls['getAttr']
+    assert registry.record(name) is record
+    assert registry.names() == [name]
+    assert scene.calls['getAttr'] == reads
+
+
+def test_edited_records_are_read_again(scene):
+    name = registerLimb(scene, 'arm')
+    registry = limb_registry.getRegistry()
+    record = registry.record(name)
+    limb_record.writeLimbRecord(name + limb_registry.DATA_SUFFIX, dataclasses.replace(record, pole_distance=5.0))
+    assert registry.record(name).pole_distance == 5.0
+
+
+def test_added_removed_and_renamed_limbs(scene):
+    registry = limb_registry.getRegistry()
+    assert registry.names() == []
+    arm = registerLimb(scene, 'arm')
+    leg = registerLimb(scene, 'leg')
+    assert sorted(registry.names()) == [arm, leg]
+
+    scene.delete(leg + limb_registry.DATA_SUFFIX)
+    assert registry.names() == [arm]
+
+    scene.rename(arm + limb_registry.DATA_SUFFIX, 'arm_renamed' + limb_registry.DATA_SUFFIX)
+    assert registry.names() == ['arm_renamed']
+
+    scene.file(new=True, force=True)
+    assert registry.names() == []
+
+
+def test_registering_again_rewrites_the_limb(scene):
+    data = synthetic_rigs.buildLimb(scene, 'arm')
+    name = data[0]
+    match_utilities.MatchData(data)
+    match_utilities.MatchData(data, pole_index=None)
+    assert scene.ls('*' + limb_registry.DATA_SUFFIX + '*', type='network') == [name + limb_registry.DATA_SUFFIX]
+    assert limb_registry.getRegistry().names() == [name]
+    assert limb_registry.getRegistry().record(name).pole_index is None
+    assert match_utilities.matchLimbs() == [name]
+
+
+def test_renamed_duplicates_are_not_limbs(scene):
+    # Left by registering a limb twice before limb nodes were taken over
+    name = registerLimb(scene, 'arm')
+    duplicate = scene.createNode('network', n=name + limb_registry.DATA_SUFFIX)
+    limb_registry.tagLimbNode(duplicate)
+    assert duplicate == name + limb_registry.DATA_SUFFIX + '1'
+    assert limb_registry.getRegistry().names() == [name]
+    assert match_utilities.blendStates() == {name: ('ik', 1.0)}
+
+
+def test_new_backend_starts_over(scene):
+    registerLimb(scene, 'arm')
+    assert limb_registry.getRegistry().names() == ['arm_switch']
+    other = type(scene)()
+    cmds_backend.setBackend(other)
+    assert limb_registry.getRegistry().names() == []
+
+
+def test_template_instances(scene):
+    data = synthetic_rigs.buildCrowd(scene, 'arm', 3)
+    match_utilities.MatchData(data[0], template=True)
+    registry = limb_registry.getRegistry()
+    assert registry.names() == ['arm_switch']
+    assert sorted(registry.instances('arm_switch')) == ['crowd0000', 'crowd0001', 'crowd0002']
+
+
+def referenceLimb(scene, name, namespace):
+
+    """Registers a limb then puts it under a namespace with a limb set of its own, like a rig
+    registered in its own file and referenced, whose record keeps names without the namespace"""
+
+    nodes = set(scene.ls())
+    limb = registerLimb(scene, name)
+    data_node = limb + limb_registry.DATA_SUFFIX
+    scene.sets(data_node, remove=limb_registry.LIMB_SET)
+    if limb_registry.LIMB_SET not in nodes:
+        scene.delete(limb_registry.LIMB_SET)
+    limb_set = scene.sets(name=namespace + ':' + limb_registry.LIMB_SET, empty=True)
+    scene.sets(data_node, add=limb_set)
+    for node in set(scene.ls()) - nodes - {limb_set}:
+        scene.rename(node, namespace + ':' + node)
+    return namespace + ':' + limb
+
+
+def test_limbs_referenced_after_registering(scene):
+    prop = registerLimb(scene, 'prop')
+    arm = referenceLimb(scene, 'arm', 'charB')
+    registry = limb_registry.getRegistry()
+    assert sorted(registry.names()) == [arm, prop]
+    assert registry.record(arm).blend_attr == arm + '.ikFk'
+    assert sorted(match_utilities.matchLimbs()) == [arm, prop]
+
+
+def test_limbs_registered_after_referencing(scene):
+    arm = referenceLimb(scene, 'arm', 'charB')
+    assert limb_registry.getRegistry().names() == [arm]
+    prop = registerLimb(scene, 'prop')
+    assert sorted(limb_registry.getRegistry().names()) == [arm, prop]
+    # The root set leaves the referenced limbs to their own set
+    assert scene.sets(limb_registry.LIMB_SET, q=True) == [prop + limb_registry.DATA_SUFFIX]
@@ -0,0 +1,269 @@
+import numpy as np
+import pytest
+
+from helpers import importModule, worldMatrices
+
+
+limb_registry = importModule('libs.limb_registry')
+match_utilities = importModule('libs.match_utilities')
+matrix_utilities = importModule('libs.matrix_utilities')
+synthetic_rigs = importModule('benchmarks.synthetic_rigs')
+
+FRAMES = 20
+
+
+@pytest.fixture
+def animated_arm(scene):
+
+    """Registers a two-bone limb sitting in IK, its ik joints animated over FRAMES frames, returns its record"""
+
+    data = synthetic_rigs.buildLimb(scene, 'arm', seed=3)
+    match_utilities.MatchData(data)
+    synthetic_rigs.animateLimb(scene, data, FRAMES)
+    return limb_registry.getRegistry().record('arm_switch')
+
+
+def fkTargets(scene, record, time=None, blend=None):
+
+    """Where the fk controls of a limb sit once matched onto its ik joints, or onto the pose a blend shows"""
+
+    poses = worldMatrices(scene, record.ik_joints, time)
+    if blend is not None:
+        poses = matrix_utilities.blendMatrices(worldMatrices(scene, record.fk_joints, time), poses,
+                                               np.full(len(poses), blend))
+    return match_utilities.Match.fromRecord(record).fk_offsets @ poses
+
+
+def fkErrors(scene, record, time=None):
+
+    """Largest (translate, rotate) distance of the fk controls of a limb from their targets"""
+
+    residuals = matrix_utilities.matrixResiduals(worldMatrices(scene, record.fk_controls, time),
+                                                 fkTargets(scene, record, time))
+    return tuple(residual.max() for residual in residuals)
+
+
+def keyTimes(scene, nodes):
+
+    """Lists the sorted key times of every curve of the nodes"""
+
+    return sorted(set(time for node in nodes for time in scene.keyframe(node, q=True, timeChange=True) or []))
+
+
+def test_switch_to_fk(scene, arm):
+    assert match_utilities.matchLimbs() == ['arm_switch']
+    np.testing.assert_allclose(worldMatrices(scene, arm.fk_controls), fkTargets(scene, arm), atol=1e-6)
+    assert scene.getAttr(arm.blend_attr) == arm.fk_blend_value
+
+
+def test_switch_to_ik(scene, arm):
+    scene.setAttr(arm.blend_attr, arm.fk_blend_value)
+    assert match_utilities.matchLimbs() == ['arm_switch']
+    assert scene.getAttr(arm.blend_attr) == arm.ik_blend_value
+
+    # Both ends snap onto the fk joints, the pole lands on the plane of the fk chain
+    targets = match_utilities.Match.fromRecord(arm).ik_offsets @ worldMatrices(scene, arm.fk_joints)
+    controls = worldMatrices(scene, arm.ik_controls)
+    np.testing.assert_allclose(controls[[0, 2]], targets[[0, 2]], atol=1e-6)
+    root, middle, end = worldMatrices(scene, arm.fk_joints)[:, 3, :3]
+    normal = np.cross(middle - root, end - root)
+    assert abs(np.dot(controls[1, 3, :3] - root, normal / np.linalg.norm(normal))) < 1e-6
+
+
+def test_residuals(scene, arm):
+    assert match_utilities.matchResiduals()['arm_switch'][0] > 1e-3
+    match_utilities.matchLimbs(flip_matched=False)
+    scene.setAttr(arm.blend_attr, arm.ik_blend_value)
+    np.testing.assert_allclose(match_utilities.matchResiduals()['arm_switch'], (0.0, 0.0), atol=1e-6)
+
+
+def test_matched_limbs_are_not_written(scene, arm):
+    match_utilities.matchLimbs()
+    scene.setAttr(arm.blend_attr, arm.ik_blend_value)
+    writes = scene.calls['setAttr']
+    # The fk controls already sit on their targets, only the blend switches
+    assert match_utilities.matchLimbs() == ['arm_switch']
+    assert scene.calls['setAttr'] == writes + 1
+    assert scene.getAttr(arm.blend_attr) == arm.fk_blend_value
+
+    # Nothing at all without flipping
+    scene.setAttr(arm.blend_attr, arm.ik_blend_value)
+    writes = scene.calls['setAttr']
+    match_utilities.matchLimbs(flip_matched=False)
+    assert scene.calls['setAttr'] == writes
+
+
+def test_partial_blend(scene, arm):
+    for joint in arm.fk_joints:
+        scene.setAttr(joint + '.rotate', 10, -20, 30)
+    scene.setAttr(arm.blend_attr, 0.3)
+    assert match_utilities.blendStates() == {'arm_switch': (match_utilities.PARTIAL, 0.3)}
+
+    # Left alone unless partial limbs are matched
+    assert match_utilities.matchLimbs(partial=False) == []
+    assert scene.getAttr(arm.blend_attr) == 0.3
+
+    targets = fkTargets(scene, arm, blend=0.3)
+    assert match_utilities.matchLimbs() == ['arm_switch']
+    np.testing.assert_allclose(worldMatrices(scene, arm.fk_controls), targets, atol=1e-6)
+    assert scene.getAttr(arm.blend_attr) == arm.fk_blend_value
+
+
+def test_blend_tolerance(scene, arm):
+    tolerance = match_utilities.BLEND_TOLERANCE * abs(arm.ik_blend_value - arm.fk_blend_value)
+    step = np.sign(arm.ik_blend_value - arm.fk_blend_value) * tolerance
+    for value, state in ((arm.ik_blend_value - 0.5 * step, match_utilities.IK),
+                         (arm.ik_blend_value - 2.0 * step, match_utilities.PARTIAL),
+                         (arm.fk_blend_value + 0.5 * step, match_utilities.FK),
+                         (arm.fk_blend_value + 2.0 * step, match_utilities.PARTIAL)):
+        scene.setAttr(arm.blend_attr, value)
+        assert match_utilities.blendStates() == {'arm_switch': (state, value)}
+
+
+def test_controls_under_another_limb(scene, arm):
+    # The hand's fk controls follow the arm's last fk control, which the same batch moves
+    hand_data = synthetic_rigs.buildLimb(scene, 'hand', seed=5, control_parent=arm.fk_controls[-1])
+    match_utilities.MatchData(hand_data)
+    hand = limb_registry.getRegistry().record(hand_data[0])
+    assert sorted(match_utilities.matchLimbs()) == ['arm_switch', 'hand_switch']
+    for record in (arm, hand):
+        np.testing.assert_allclose(worldMatrices(scene, record.fk_controls), fkTargets(scene, record), atol=1e-6)
+
+
+def test_template_instances(scene):
+    crowd = synthetic_rigs.buildCrowd(scene, 'arm', 3, seed=3)
+    match_utilities.MatchData(crowd[0], template=True)
+    blend_attributes = ['%s.%s' % (data[0], data[1]) for data in crowd]
+
+    # A 'namespace:limb' name picks one instance of the template
+    assert match_utilities.matchLimbs(['crowd0001:arm_switch']) == ['crowd0001:arm_switch']
+    assert [scene.getAttr(attribute) for attribute in blend_attributes] == [1.0, 0.0, 1.0]
+    record = limb_registry.getRegistry().record('arm_switch').bind('crowd0001')
+    np.testing.assert_allclose(worldMatrices(scene, record.fk_controls), fkTargets(scene, record), atol=1e-6)
+
+    # The template name goes through every instance
+    assert sorted(match_utilities.matchLimbs(['arm_switch'])) == ['crowd0000:arm_switch', 'crowd0001:arm_switch',
+                                                                  'crowd0002:arm_switch']
+    assert [scene.getAttr(attribute) for attribute in blend_attributes] == [0.0, 1.0, 0.0]
+    for namespace in ('crowd0000', 'crowd0002'):
+        record = limb_registry.getRegistry().record('arm_switch').bind(namespace)
+        np.testing.assert_allclose(worldMatrices(scene, record.fk_controls), fkTargets(scene, record), atol=1e-6)
+
+
+def test_long_chain(scene):
+    match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'spine', seed=4, joints=5))
+    spine = limb_registry.getRegistry().record('spine_switch')
+    assert len(spine.fk_controls) == len(spine.ik_controls) == 5
+
+    assert match_utilities.matchLimbs() == ['spine_switch']
+    np.testing.assert_allclose(worldMatrices(scene, spine.fk_controls), fkTargets(scene, spine), atol=1e-6)
+
+    # Without a pole vector every ik control lands on its fk joint
+    assert match_utilities.matchLimbs() == ['spine_switch']
+    targets = match_utilities.Match.fromRecord(spine).ik_offsets @ worldMatrices(scene, spine.fk_joints)
+    np.testing.assert_allclose(worldMatrices(scene, spine.ik_controls), targets, atol=1e-6)
+
+
+def test_pole_only_on_two_bone_limbs(scene):
+    match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'spine', joints=5))
+    match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'leg'), pole_index=None)
+    match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'tail', joints=5), pole_index=2, pole_distance=12.0)
+    registry = limb_registry.getRegistry()
+    assert registry.record('spine_switch').pole_index is None
+    assert registry.record('leg_switch').pole_index is None
+    assert (registry.record('tail_switch').pole_index, registry.record('tail_switch').pole_distance) == (2, 12.0)
+    with pytest.raises(RuntimeError):
+        match_utilities.MatchData(synthetic_rigs.buildLimb(scene, 'neck'), pole_index=2)
+
+
+def test_bake(scene, animated_arm):
+    assert match_utilities.matchLimbs(bake=True, start=1, end=FRAMES) == ['arm_switch']
+    for time in range(1, FRAMES + 1):
+        np.testing.assert_allclose(fkErrors(scene, animated_arm, time), (0.0, 0.0), atol=1e-6)
+    assert keyTimes(scene, animated_arm.fk_controls) == list(range(1, FRAMES + 1))
+    blend_node, blend_attribute = animated_arm.blend_attr.split('.')
+    assert scene.keyframe(blend_node, q=True, timeChange=True, attribute=blend_attribute) == [1, FRAMES]
+
+
+def test_bake_clears_stale_keys(scene, animated_arm):
+    # Keys the bake's reduced curves would otherwise interpolate through
+    for control in animated_arm.fk_controls:
+        for time in range(1, FRAMES + 1):
+            for channel in ('translateX', 'rotateY'):
+                scene.setKeyframe(control, attribute=channel, time=time, value=100.0 * (-1) ** time)
+
+    report = {}
+    match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, key_tolerance=(0.001, 0.01), report=report)
+    assert report['kept_keys'] < report['keys']
+    for time in range(1, FRAMES + 1):
+        translate_error, rotate_error = fkErrors(scene, animated_arm, time)
+        assert translate_error < 0.01 and rotate_error < 0.1
+
+
+def test_bake_keeps_keys_outside_its_range(scene, animated_arm):
+    control = animated_arm.fk_controls[0]
+    for time in (1, 3, 12, FRAMES):
+        scene.setKeyframe(control, attribute='translateX', time=time, value=50.0)
+    match_utilities.matchLimbs(bake=True, start=5, end=15)
+    # The range is replaced, the animator's keys around it stay
+    assert scene.keyframe(control, q=True, timeChange=True, attribute='translateX') == [1, 3] + list(range(5, 16)) + [FRAMES]
+    assert scene.getAttr(control + '.translateX', time=1) == 50.0
+
+
+def test_bounded_bakes_key_linear_tangents(scene, animated_arm):
+    with pytest.raises(ValueError):
+        match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, key_tolerance=0.01, tangent='auto')
+    with pytest.raises(ValueError):
+        match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, sample_tolerance=0.01, tangent='spline')
+    assert keyTimes(scene, animated_arm.fk_controls) == []
+
+
+def test_adaptive_bake(scene, animated_arm):
+    report = {}
+    match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, sample_tolerance=(0.05, 0.5), report=report)
+    assert report['evaluated_frames'] < FRAMES
+    keyed = keyTimes(scene, animated_arm.fk_controls)
+    assert keyed[0] == 1 and keyed[-1] == FRAMES
+    for time in keyed:
+        np.testing.assert_allclose(fkErrors(scene, animated_arm, time), (0.0, 0.0), atol=1e-6)
+    # The tolerance holds per channel, errors add up down the three controls of the chain
+    for time in range(1, FRAMES + 1):
+        translate_error, rotate_error = fkErrors(scene, animated_arm, time)
+        assert translate_error < 3 * 0.05 and rotate_error < 3 * 0.5
+
+
+def test_bake_on_keys(scene, animated_arm):
+    for time in (1, 7, 13):
+        scene.setKeyframe(animated_arm.ik_controls[0], attribute='translateX', time=time, value=0.0)
+    assert match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, on_keys=True) == ['arm_switch']
+    assert keyTimes(scene, animated_arm.fk_controls) == [1, 7, 13]
+    for time in (1, 7, 13):
+        np.testing.assert_allclose(fkErrors(scene, animated_arm, time), (0.0, 0.0), atol=1e-6)
+
+
+def test_bake_on_keys_without_keys(scene, animated_arm):
+    report = {}
+    assert match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, on_keys=True, report=report) == []
+    assert report['unkeyed'] == [animated_arm.blend_attr]
+    assert keyTimes(scene, animated_arm.fk_controls) == []
+    blend_node, blend_attribute = animated_arm.blend_attr.split('.')
+    assert scene.keyframe(blend_node, q=True, timeChange=True, attribute=blend_attribute) is None
+    assert scene.getAttr(animated_arm.blend_attr) == animated_arm.ik_blend_value
+
+
+def test_bake_over_processes(scene, animated_arm, monkeypatch):
+    # Small enough chunks for a 20 frame bake to go through the pool
+    monkeypatch.setattr(match_utilities, '_POOL_CHUNK_SOLVES', 1)
+    match_utilities.matchLimbs(bake=True, start=1, end=FRAMES, processes=2)
+    for time in range(1, FRAMES + 1):
+        np.testing.assert_allclose(fkErrors(scene, animated_arm, time), (0.0, 0.0), atol=1e-6)
+
+
+def test_pivots(scene, arm):
+    rng = np.random.default_rng(0)
+    for control in arm.fk_controls:
+        scene.setAttr(control + '.rotatePivot', *rng.uniform(-2, 2, 3))
+        scene.setAttr(control + '.scalePivot', *rng.uniform(-2, 2, 3))
+        scene.setAttr(control + '.rotatePivotTranslate', *rng.uniform(-1, 1, 3))
+    match_utilities.matchLimbs()
+    np.testing.assert_allclose(worldMatrices(scene, arm.fk_controls), fkTargets(scene, arm), atol=1e-6)
@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from helpers import importModule
+
+
+matrix_utilities = importModule('libs.matrix_utilities')
+scene_io = importModule('libs.scene_io')
+
+ROTATE_ORDERS = range(6)
+
+
+@pytest.mark.parametrize('rotate_order', ROTATE_ORDERS)
+def test_euler_round_trip(rotate_order):
+    rotates = np.random.default_rng(rotate_order).uniform(-80, 80, (50, 3))
+    rotations = matrix_utilities.eulerToRotations(rotates, rotate_order)
+    np.testing.assert_allclose(matrix_utilities.rotationsToEuler(rotations, rotate_order), rotates, atol=1e-9)
+
+
+def test_euler_round_trip_mixed_orders():
+    rotates = np.random.default_rng(0).uniform(-80, 80, (6, 3))
+    rotate_orders = np.arange(6)
+    rotations = matrix_utilities.eulerToRotations(rotates, rotate_orders)
+    np.testing.assert_allclose(matrix_utilities.rotationsToEuler(rotations, rotate_orders), rotates, atol=1e-9)
+
+
+@pytest.mark.parametrize('rotate_order', ROTATE_ORDERS)
+@pytest.mark.parametrize('node_type', ('transform', 'joint'))
+def test_decompose_matches_scene(scene, rotate_order, node_type):
+    rng = np.random.default_rng(rotate_order)
+    node = scene.createNode(node_type, n='node')
+    values = {'translate': rng.uniform(-10, 10, 3),
+              'rotate': rng.uniform(-80, 80, 3),
+              'scale': rng.uniform(0.5, 2.0, 3),
+              'rotateAxis': rng.uniform(-45, 45, 3)}
+    if node_type == 'joint':
+        values['jointOrient'] = rng.uniform(-45, 45, 3)
+    scene.setAttr(node + '.rotateOrder', rotate_order)
+    for attribute, value in values.items():
+        scene.setAttr('%s.%s' % (node, attribute), *value)
+
+    matrices = np.reshape(scene.getAttr(node + '.matrix'), (1, 4, 4))
+    translates, rotates, scales = matrix_utilities.decomposeMatrices(
+        matrices, [rotate_order], values['rotateAxis'][None], values.get('jointOrient', np.zeros(3))[None])
+    np.testing.assert_allclose(translates[0], values['translate'], atol=1e-9)
+    np.testing.assert_allclose(rotates[0], values['rotate'], atol=1e-9)
+    np.testing.assert_allclose(scales[0], values['scale'], atol=1e-9)
+
+
+@pytest.mark.parametrize('rotate_order', ROTATE_ORDERS)
+def test_decompose_takes_pivots_out(scene, rotate_order):
+    rng = np.random.default_rng(rotate_order)
+    node = scene.createNode('transform', n='node')
+    scene.setAttr(node + '.rotateOrder', rotate_order)
+    values = {attribute: rng.uniform(-5, 5, 3) for attribute in scene_io.PIVOT_ATTRIBUTES + ('translate', 'rotate')}
+    values['scale'] = rng.uniform(0.5, 2.0, 3)
+    for attribute, value in values.items():
+        scene.setAttr('%s.%s' % (node, attribute), *value)
+
+    matrices = np.reshape(scene.getAttr(node + '.matrix'), (1, 4, 4))
+    pivots = tuple(values[attribute][None] for attribute in scene_io.PIVOT_ATTRIBUTES)
+    translates, rotates, scales = matrix_utilities.decomposeMatrices(matrices, [rotate_order], pivots=pivots)
+    np.testing.assert_allclose(translates[0], values['translate'], atol=1e-9)
+    np.testing.assert_allclose(rotates[0], values['rotate'], atol=1e-9)
+
+
+def test_compose_decompose_round_trip():
+    rng = np.random.default_rng(1)
+    translates = rng.uniform(-10, 10, (6, 3))
+    rotates = rng.uniform(-80, 80, (6, 3))
+    scales = rng.uniform(0.5, 2.0, (6, 3))
+    matrices = matrix_utilities.composeMatrices(translates, rotates, np.arange(6), scales)
+    decomposed = matrix_utilities.decomposeMatrices(matrices, np.arange(6))
+    for values, expected in zip(decomposed, (translates, rotates, scales)):
+        np.testing.assert_allclose(values, expected, atol=1e-9)
+
+
+@pytest.mark.parametrize('rotate_order', ROTATE_ORDERS)
+def test_filter_euler_removes_flips(rotate_order):
+    frames = np.linspace(0.0, 1.0, 40)[:, None]
+    smooth = np.array([150.0, 20.0, -170.0]) + frames * np.array([80.0, 40.0, -60.0])
+    rotations = matrix_utilities.eulerToRotations(smooth, rotate_order)
+
+    # Every other frame on the other side of the middle axis, everything wrapped to +-180
+    middle = np.arange(3) == matrix_utilities._ORDER_AXES[rotate_order][1]
+    flipped = smooth.copy()
+    flipped[1::2] = np.where(middle, 180.0 - smooth[1::2], smooth[1::2] + 180.0)
+    flipped = (flipped + 180.0) % 360.0 - 180.0
+    np.testing.assert_allclose(matrix_utilities.eulerToRotations(flipped, rotate_order), rotations, atol=1e-9)
+
+    filtered = matrix_utilities.filterEuler(flipped, rotate_order)
+    np.testing.assert_allclose(filtered, smooth + 360.0 * np.round((filtered[0] - smooth[0]) / 360.0), atol=1e-9)
+
+
+def test_filter_euler_filters_along_axis():
+    rotates = np.array([[0.0, 0.0, 179.0], [0.0, 0.0, -179.0], [0.0, 0.0, -177.0]])
+    filtered = matrix_utilities.filterEuler(np.stack((rotates, rotates)), [0], axis=1)
+    np.testing.assert_allclose(filtered[0], [[0.0, 0.0, 179.0], [0.0, 0.0, 181.0], [0.0, 0.0, 183.0]])
+    np.testing.assert_allclose(filtered[1], filtered[0])
+
+
+def test_quaternion_round_trip():
+    rotations = matrix_utilities.eulerToRotations(np.random.default_rng(2).uniform(-180, 180, (100, 3)), 0)
+    quaternions = matrix_utilities.rotationsToQuaternions(rotations)
+    np.testing.assert_allclose(matrix_utilities.quaternionsToRotations(quaternions), rotations, atol=1e-9)
+
+
+def test_slerp_halfway():
+    quaternions = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations(np.zeros(3), 0))
+    targets = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations([0.0, 0.0, 90.0], 0))
+    halfway = matrix_utilities.slerpQuaternions(quaternions, targets, 0.5)
+    np.testing.assert_allclose(matrix_utilities.quaternionsToRotations(halfway),
+                               matrix_utilities.eulerToRotations([0.0, 0.0, 45.0], 0), atol=1e-9)
+
+
+def test_slerp_takes_the_short_way():
+    quaternions = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations(np.zeros(3), 0))
+    targets = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations([0.0, 0.0, 90.0], 0))
+    # -q is the same rotation as q
+    halfway = matrix_utilities.slerpQuaternions(quaternions, -targets, 0.5)
+    np.testing.assert_allclose(matrix_utilities.quaternionsToRotations(halfway),
+                               matrix_utilities.eulerToRotations([0.0, 0.0, 45.0], 0), atol=1e-9)
+
+
+def test_slerp_ends_and_equal_rotations():
+    rng = np.random.default_rng(3)
+    quaternions = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations(rng.uniform(-90, 90, (5, 3)), 0))
+    targets = matrix_utilities.rotationsToQuaternions(matrix_utilities.eulerToRotations(rng.uniform(-90, 90, (5, 3)), 0))
+    same_sign = np.sign(np.sum(quaternions * targets, axis=-1, keepdims=True))
+    np.testing.assert_allclose(matrix_utilities.slerpQuaternions(quaternions, targets, np.zeros(5)), quaternions, atol=1e-9)
+    np.testing.assert_allclose(matrix_utilities.slerpQuaternions(quaternions, targets, np.ones(5)), targets * same_sign,
+                               atol=1e-9)
+    np.testing.assert_allclose(matrix_utilities.slerpQuaternions(quaternions, quaternions, np.full(5, 0.3)), quaternions,
+                               atol=1e-9)
+
+
+def test_blend_matrices():
+    matrices = matrix_utilities.composeMatrices(np.array([[0.0, 0.0, 0.0]]), np.zeros((1, 3)), [0],
+                                                np.array([[1.0, 1.0, 1.0]]))
+    targets = matrix_utilities.composeMatrices(np.array([[4.0, 2.0, 0.0]]), np.array([[0.0, 90.0, 0.0]]), [0],
+                                               np.array([[3.0, 3.0, 3.0]]))
+
+    np.testing.assert_allclose(matrix_utilities.blendMatrices(matrices, targets, [0.0]), matrices, atol=1e-9)
+    np.testing.assert_allclose(matrix_utilities.blendMatrices(matrices, targets, [1.0]), targets, atol=1e-9)
+
+    halfway = matrix_utilities.blendMatrices(matrices, targets, [0.5])
+    translates, rotates, scales = matrix_utilities.decomposeMatrices(halfway, [0])
+    np.testing.assert_allclose(translates, [[2.0, 1.0, 0.0]], atol=1e-9)
+    np.testing.assert_allclose(rotates, [[0.0, 45.0, 0.0]], atol=1e-9)
+    np.testing.assert_allclose(scales, [[2.0, 2.0, 2.0]], atol=1e-9)
@@ -0,0 +1,32 @@
+import numpy as np
+
+from helpers import importModule
+
+
+scene_io = importModule('libs.scene_io')
+transaction = importModule('libs.transaction')
+
+
+def test_redo_and_undo(scene):
+    nodes = [scene.createNode('transform', n='node_%d' % i) for i in range(2)]
+    scene.addAttr(nodes[0], ln='blend', at='double', dv=1.0)
+    io = scene_io.getSceneIO()
+    before = io.readTransforms(nodes)
+
+    translates = np.arange(6.0).reshape(2, 3)
+    rotates = translates * 10.0
+    match_transaction = transaction.Transaction()
+    match_transaction.recordTransforms(io, nodes, translates, rotates)
+    match_transaction.recordAttributes(io, [nodes[0] + '.blend'], [0.0])
+
+    # Nothing is written before the transaction is committed
+    np.testing.assert_allclose(io.readTransforms(nodes), before)
+    transaction.commit(match_transaction)
+    np.testing.assert_allclose(io.readTransforms(nodes), (translates, rotates))
+    assert scene.getAttr(nodes[0] + '.blend') == 0.0
+
+    match_transaction.undo()
+    np.testing.assert_allclose(io.readTransforms(nodes), before)
+    assert scene.getAttr(nodes[0] + '.blend') == 1.0
+    match_transaction.redo()
+    np.testing.assert_allclose(io.readTransforms(nodes), (translates, rotates))
@@ -17,7 +17,7 @@ class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         if not MainWindow.objectName():
             MainWindow.setObjectName(u"MainWindow")
-        MainWindow.resize(263, 148)
+        MainWindow.resize(263, 283)
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName(u"centralwidget")
         self.verticalLayout = QVBoxLayout(self.centralwidget)
@@ -55,6 +55,23 @@ class Ui_MainWindow(object):
 
         self.main_layout.addWidget(self.getData_button, 1, 2, 1, 1)
 
+        self.matchAll_button = QPushButton(self.centralwidget)
+        self.matchAll_button.setObjectName(u"matchAll_button")
+        self.matchAll_button.setMinimumSize(QSize(0, 50))
+        self.matchAll_button.setMaximumSize(QSize(16777215, 50))
+
+        self.main_layout.addWidget(self.matchAll_button, 2, 0, 1, 3)
+
+        self.bake_checkBox = QCheckBox(self.centralwidget)
+        self.bake_checkBox.setObjectName(u"bake_checkBox")
+
+        self.main_layout.addWidget(self.bake_checkBox, 3, 0, 1, 3)
+
+        self.keys_checkBox = QCheckBox(self.centralwidget)
+        self.keys_checkBox.setObjectName(u"keys_checkBox")
+
+        self.main_layout.addWidget(self.keys_checkBox, 4, 0, 1, 3)
+
 
         self.verticalLayout.addLayout(self.main_layout)
 
@@ -70,5 +87,14 @@ class Ui_MainWindow(object):
         self.limb_label.setText(QCoreApplication.translate("MainWindow", u"LIMB", None))
         self.match_button.setText(QCoreApplication.translate("MainWindow", u"MATCH", None))
         self.getData_button.setText(QCoreApplication.translate("MainWindow", u"GET DATA", None))
+#if QT_CONFIG(tooltip)
+        self.matchAll_button.setToolTip(QCoreApplication.translate("MainWindow", u"Matches the limbs of the selected controls and joints, or every limb when nothing is selected", None))
+#endif // QT_CONFIG(tooltip)
+        self.matchAll_button.setText(QCoreApplication.translate("MainWindow", u"MATCH ALL", None))
+        self.bake_checkBox.setText(QCoreApplication.translate("MainWindow", u"BAKE TIMELINE RANGE", None))
+#if QT_CONFIG(tooltip)
+        self.keys_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Bakes only on the frames the animated side is already keyed on", None))
+#endif // QT_CONFIG(tooltip)
+        self.keys_checkBox.setText(QCoreApplication.translate("MainWindow", u"ON EXISTING KEYS ONLY", None))
     # retranslateUi
 
@@ -243,6 +243,11 @@ class Ui_MainWindow(object):
 
         self.verticalLayout.addLayout(self.FK_formLayout)
 
+        self.template_checkBox = QCheckBox(self.main_widget)
+        self.template_checkBox.setObjectName(u"template_checkBox")
+
+        self.verticalLayout.addWidget(self.template_checkBox, 0, Qt.AlignHCenter)
+
         self.sendToDatabase_button = QPushButton(self.main_widget)
         self.sendToDatabase_button.setObjectName(u"sendToDatabase_button")
         self.sendToDatabase_button.setMinimumSize(QSize(180, 40))
@@ -293,6 +298,10 @@ class Ui_MainWindow(object):
         self.fk_ctrl02_lineEdit.setText("")
         self.fk_ctrl03_label.setText(QCoreApplication.translate("MainWindow", u"FK Control 03", None))
         self.fk_ctrl03_lineEdit.setText("")
+#if QT_CONFIG(tooltip)
+        self.template_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Stores the limb without namespaces so it matches every reference of the rig", None))
+#endif // QT_CONFIG(tooltip)
+        self.template_checkBox.setText(QCoreApplication.translate("MainWindow", u"SHARE WITH EVERY NAMESPACE", None))
         self.sendToDatabase_button.setText(QCoreApplication.translate("MainWindow", u"SEND TO DATABASE", None))
     # retranslateUi
 
@@ -79,7 +79,7 @@ class mainUI(QtWidgets.QMainWindow):
         self.setWindowFlags(QtCore.Qt.Window)
 
         # Window resizing
-        self.setFixedSize(260, 145)
+        self.setFixedSize(260, 280)
 
         if MAYA:
             # Makes Maya perform magic which makes the window stay
@@ -98,13 +98,13 @@ class mainUI(QtWidgets.QMainWindow):
         self.setCentralWidget(self.main_widget)
 
         # Add the available rigs data to the combo box
-        data_nodes = cmds.ls(type='network')
-        rigs_data_list = [data.removesuffix('_DATA') for data in data_nodes]
+        rigs_data_list = match_utilities._limbNames()
         self.main_widget.limb_comboBox.addItems(rigs_data_list)
 
         # Signals
         self.main_widget.getData_button.clicked.connect(lambda: matchData_UI.run_maya())
-        self.main_widget.match_button.clicked.connect(lambda: match_utilities._matchProcess(self.main_widget.limb_comboBox))
+        self.main_widget.match_button.clicked.connect(lambda: match_utilities._matchProcess(self.main_widget.limb_comboBox, self.main_widget.bake_checkBox.isChecked(), self.main_widget.keys_checkBox.isChecked()))
+        self.main_widget.matchAll_button.clicked.connect(lambda: match_utilities._matchAllProcess(self.main_widget.bake_checkBox.isChecked(), self.main_widget.keys_checkBox.isChecked()))
 
 
 # ----------------------------------------------------------------------
@@ -78,7 +78,7 @@ class MatchDataUI(QtWidgets.QMainWindow):
         self.setWindowFlags(QtCore.Qt.Window)
 
         # Window resizing
-        self.setFixedSize(355, 700)
+        self.setFixedSize(355, 730)
 
         if MAYA:
             # Makes Maya perform magic which makes the window stay
@@ -112,7 +112,11 @@ class MatchDataUI(QtWidgets.QMainWindow):
                             self.main_widget.fk_ctrl02_lineEdit, 
                             self.main_widget.fk_ctrl03_lineEdit)
         
-        self.main_widget.sendToDatabase_button.clicked.connect(lambda: match_utilities._databaseProcess(self.data_fields))
+        # Joint and control fields take several names for chains longer than three
+        for field in self.data_fields[2:]:
+            field.setToolTip("One name, or several names separated by spaces for longer chains")
+
+        self.main_widget.sendToDatabase_button.clicked.connect(lambda: match_utilities._databaseProcess(self.data_fields, self.main_widget.template_checkBox.isChecked()))
 
 
 